@@ -1,5 +1,8 @@
-from portality import models, dao
+from portality import models, dao, lookup, metrics
+from portality.core import app
 from datetime import datetime
+from collections import OrderedDict
+import json, time
 
 class AuthorisationException(Exception):
     pass
@@ -8,96 +11,310 @@ class APIException(Exception):
     pass
 
 class RegistryAPI(object):
+    # the operations which may be carried out on records in a bulk request
+    BULK_OPERATIONS = ["create", "merge", "replace", "delete"]
+    
+    # the index types which may be retrieved in full via dump
+    DUMP_TYPES = ["register", "statistics", "history"]
+    
+    # search results are cached against the registry generation in which they were made.  Every
+    # change to the registry, by any process, moves the generation on, so stale results are served for
+    # no longer than QUERY_CACHE_GENERATION_INTERVAL
+    _search_cache = dao.TTLCache(app.config.get("QUERY_CACHE_SIZE", 500), app.config.get("QUERY_CACHE_TTL", 300),
+                                    max_bytes=app.config.get("QUERY_CACHE_BYTES", 50 * 1024 * 1024))
+    
+    # the last registry generation read from the index, as (generation, time of the latest change, time read),
+    # which is reused for QUERY_CACHE_GENERATION_INTERVAL seconds rather than read before every search
+    _generation = None
+    
     @classmethod
     def get_registry_entry(cls, record_id):
         register = models.Register.pull(record_id)
         return register
     
     @classmethod
-    def search(cls, es=None, q=None, fields=None, from_number=None, size=None):
-        search_query = dao.SearchQuery(es, q, fields, from_number, size)
-        es_results = models.Register.query(q=search_query.query())
-        return es_results
+    def get_registry_entry_with_etag(cls, record_id):
+        pulled = models.Register.pull_with_version(record_id)
+        if pulled is None:
+            return None, None
+        register, version = pulled
+        return register, models.Register.make_etag(register.id, register.data.get("last_updated"), version)
     
     @classmethod
-    def change_list(cls, from_date=None, until_date=None, from_number=None, size=None):
-        range_query = dao.SearchQuery(from_number=from_number, size=size, 
-                        from_date=from_date, until_date=until_date, order=("last_updated", "asc"))
-        es_results = models.Register.query(q=range_query.query())
-        return es_results
+    def get_registry_entry_as_of(cls, record_id, as_of):
+        """
+        Get the record as it was at the given date.  This will either be the current record, or an
+        entry from its history
+        """
+        as_of = cls._normalise_date(as_of)
+        register = models.Register.pull(record_id)
+        if register is None:
+            return None
+        
+        # the record did not exist yet
+        created = register.data.get("created_date")
+        if created is not None and created > as_of:
+            return None
+        
+        # the record has not changed since
+        last_updated = register.data.get("last_updated")
+        if last_updated is None or last_updated <= as_of:
+            return register.data
+        
+        entry = models.History.rebuild_as_of(record_id, as_of)
+        if entry is None:
+            return register.data
+        return cls._history_as_record(record_id, entry, created)
+    
+    @classmethod
+    def _history_as_record(cls, record_id, entry, created):
+        # give the entry the shape of the record, so that the response is the same wherever it came from.
+        # The entry's own id and dates are those of the history entry, so are replaced by the record's
+        record = dict([(k, v) for k, v in entry.iteritems() if k not in ["id", "about", "triggered_by_account", "created_date", "last_updated", "discarded"]])
+        record["id"] = record_id
+        if created is not None:
+            record["created_date"] = created
+        return record
+    
+    @classmethod
+    def get_registry_entries(cls, record_ids):
+        return models.Register.pull_many(record_ids)
+    
+    @classmethod
+    def get_registry_etag(cls, record_id):
+        info = models.Register.pull_version(record_id)
+        if info is None:
+            return None
+        last_updated, version = info
+        return models.Register.make_etag(record_id, last_updated, version)
+    
+    @classmethod
+    def search(cls, es=None, q=None, fields=None, from_number=None, size=None, cursor=None):
+        search_query = cls._search_query(full_query=es, query_string=q, fields=fields, 
+                        from_number=from_number, size=size, cursor=cursor)
+        return cls._cached_search(search_query)
+    
+    @classmethod
+    def change_list(cls, from_date=None, until_date=None, from_number=None, size=None, cursor=None):
+        range_query = cls._search_query(from_number=from_number, size=size, 
+                        from_date=from_date, until_date=until_date, order=("last_updated", "asc"),
+                        cursor=cursor)
+        return cls._cached_search(range_query)
+    
+    @classmethod
+    def dump(cls, type="register"):
+        """
+        Iterate over every document of the given type in the registry, as newline-delimited json
+        """
+        if type not in cls.DUMP_TYPES:
+            raise APIException(str(type) + " cannot be dumped")
+        for doc in dao.scroll(type):
+            yield json.dumps(doc) + "\n"
     
     @classmethod
     def get_history(cls, record_id, from_date=None, until_date=None):
         return models.History.list_history(record_id, from_date=from_date, until_date=until_date)
     
+    @classmethod
+    def get_history_version(cls, record_id, ver):
+        """
+        Get the given version of the record from its history, in the same shape as the record itself
+        """
+        entry = models.History.rebuild_version(record_id, ver)
+        if entry is None or entry.get("discarded", False):
+            return None
+        
+        # the record may since have been deleted, in which case its creation date is no longer known
+        register = models.Register.pull(record_id)
+        created = register.data.get("created_date") if register is not None else None
+        return cls._history_as_record(record_id, entry, created)
+    
     @classmethod
     def get_statistics(cls, record_id, from_date=None, until_date=None, provider=None, stat_type=None):
         return models.Statistics.list_statistics(record_id, from_date=from_date, until_date=until_date, provider=provider, stat_type=stat_type)
     
+    @classmethod
+    def get_statistics_series(cls, record_id, interval="month", agg="last", from_date=None, until_date=None, provider=None, stat_type=None):
+        try:
+            return models.Statistics.statistics_series(record_id, interval, agg, from_date=from_date, until_date=until_date, provider=provider, stat_type=stat_type)
+        except ValueError as e:
+            raise APIException(str(e))
+    
     @classmethod
     def create_register(cls, account, new_register):
+        record = cls._make_register(account, new_register)
+        record.save()
+        cls._registry_changed()
+        
+        # return the identifier of the newly created item
+        return record.id
+    
+    @classmethod
+    def update_register(cls, account, record, new_register):
+        snapshot = cls._merge_register(account, record, new_register)
+        snapshot.save()
+        record.save()
+        cls._registry_changed()
+    
+    @classmethod
+    def replace_register(cls, account, record, new_register):
+        snapshot = cls._replace_register(account, record, new_register)
+        snapshot.save()
+        record.save()
+        cls._registry_changed()
+    
+    @classmethod
+    def delete_register(cls, account, record):
+        snapshot = cls._delete_register(account, record)
+        snapshot.save()
+        record.save()
+        cls._registry_changed()
+    
+    @classmethod
+    def bulk_register(cls, account, operations):
+        """
+        Carry out a batch of operations on the registry, each of which is one of
+        
+            {"op" : "create", "record" : {<register object>}}
+            {"op" : "merge", "id" : "<record id>", "record" : {<register object>}}
+            {"op" : "replace", "id" : "<record id>", "record" : {<register object>}}
+            {"op" : "delete", "id" : "<record id>"}
+        
+        Operations on the same record are applied in the order given.  Returns a list with the outcome
+        for each operation, in order, which is either {"status" : 200|201, "id" : "<record id>"} or
+        {"status" : <http status code>, "error" : "<reason it was not carried out>"}
+        """
         # check permissions on the account
         if not account.registry_access:
-            raise AuthorisationException("This user account does not have permission to create objects in the registry")
+            raise AuthorisationException("This user account does not have permission to modify objects in the registry")
         
-        # ensure the register object has the right structure
-        if "register" not in new_register:
-            new_register = {"register" : new_register}
+        chunk_size = app.config.get("BULK_CHUNK_SIZE", 500)
+        results = []
+        for i in range(0, len(operations), chunk_size):
+            results += cls._bulk_register_chunk(account, operations[i:i + chunk_size])
+        return results
+    
+    @classmethod
+    def _bulk_register_chunk(cls, account, operations):
+        # get all of the existing records we are going to need in one go
+        ids = [op.get("id") for op in operations if isinstance(op, dict) and op.get("op") != "create" and isinstance(op.get("id"), basestring)]
+        records = models.Register.pull_many(ids)
         
-        # prune the third party account data if necessary
-        cls._prune_third_party(account, new_register)
-
-        # clear the created date and last updated date -> the client can't set these, only the system.
-        # they will be allocated at save for new records
-        cls._clear_admin_dates(new_register)
+        # apply the operations to the records in memory, keeping the history entries they generate
+        results = []
+        snapshots = []
+        changed = OrderedDict()
+        for op in operations:
+            try:
+                status, record, snapshot = cls._bulk_operation(account, op, records)
+            except AuthorisationException as e:
+                results.append({"status" : 401, "error" : unicode(e)})
+                continue
+            except APIException as e:
+                results.append({"status" : 400, "error" : unicode(e)})
+                continue
+            if record is None:
+                results.append({"status" : 404, "error" : "there is no record " + unicode(op.get("id"))})
+                continue
+            
+            records[record.id] = record
+            changed[record.id] = record
+            if snapshot is not None:
+                snapshots.append(snapshot)
+            results.append({"status" : status, "id" : record.id})
         
-        # we may be getting admin data too
-        if "admin" in new_register:
-            if not account.admin_access:
-                raise AuthorisationException("This user account does not have permission to set admin data on the registry")
+        if len(changed) == 0:
+            return results
+        
+        # write the history before the records, as the single record operations do
+        history = models.History.save_many(snapshots)
+        outcomes = models.Register.save_many(changed.values())
+        cls._registry_changed()
+        
+        errors = dict([(o.get("id"), o.get("error")) for o in outcomes if o.get("error") is not None])
         
-        # mint the object and save
+        # the history entries for records which were not written no longer precede a change
+        written = set([o.get("id") for o in history if o.get("error") is None])
+        orphans = [s for s in snapshots if s.data.get("about") in errors and s.id in written]
+        if len(orphans) > 0:
+            models.History.discard(orphans)
+        
+        for i in range(len(results)):
+            error = errors.get(results[i].get("id"))
+            if error is not None:
+                results[i] = {"status" : 500, "error" : error}
+        return results
+    
+    @classmethod
+    def _bulk_operation(cls, account, op, records):
+        # apply a single operation from a bulk request, returning its status, the record which has been
+        # changed (or None if the record doesn't exist) and the history entry it generated, if any
+        if not isinstance(op, dict):
+            raise APIException("operation must be a json object")
+        
+        action = op.get("op")
+        if action not in cls.BULK_OPERATIONS:
+            raise APIException("op must be one of " + ", ".join(cls.BULK_OPERATIONS))
+        
+        new_register = op.get("record")
+        if action != "delete" and not isinstance(new_register, dict):
+            raise APIException("record must be a json object")
+        if action != "delete" and "register" in new_register and not isinstance(new_register["register"], dict):
+            raise APIException("record.register must be a json object")
+        
+        if action == "create":
+            record = cls._make_register(account, new_register)
+            record.data["id"] = record.makeid()
+            return 201, record, None
+        
+        if not isinstance(op.get("id"), basestring):
+            raise APIException("id must be a string")
+        record = records.get(op.get("id"))
+        if record is None:
+            return 404, None, None
+        
+        if action == "merge":
+            snapshot = cls._merge_register(account, record, new_register)
+        elif action == "replace":
+            snapshot = cls._replace_register(account, record, new_register)
+        else:
+            snapshot = cls._delete_register(account, record)
+        return 200, record, snapshot
+    
+    @classmethod
+    def _make_register(cls, account, new_register):
+        # check permissions on the account
+        if not account.registry_access:
+            raise AuthorisationException("This user account does not have permission to create objects in the registry")
+        
+        # created date and last updated date will be allocated at save for new records
+        new_register = cls._prepare_register(account, new_register)
+        
+        # mint the object
         try:
-            record = models.Register(new_register)
+            return models.Register(new_register)
         except models.ModelException:
             raise APIException("unable to create register object from supplied data")
-        record.save()
-        
-        # return the identifier of the newly created item
-        return record.id
     
     @classmethod
-    def update_register(cls, account, record, new_register):
+    def _merge_register(cls, account, record, new_register):
         # check permissions on the account
         if not account.registry_access:
             raise AuthorisationException("This user account does not have permission to modify objects in the registry")
-
-        # ensure the register object has the right structure
-        if "register" not in new_register:
-            new_register = {"register" : new_register}
         
-        # prune the third party account data if necessary
-        cls._prune_third_party(account, new_register)
-
-        # clear the created date and last updated date -> the client can't set these, only the system.
-        # they will be merged in from the old version of the record
-        cls._clear_admin_dates(new_register)
-        
-        # we may be getting admin data too
-        if "admin" in new_register:
-            if not account.admin_access:
-                raise AuthorisationException("This user account does not have permission to set admin data on the registry")
+        # created date and last updated date will be merged in from the old version of the record
+        new_register = cls._prepare_register(account, new_register)
         
-        # snapshot, then merge the new register into the record and save
-        record.snapshot(account=account)
+        # snapshot, then merge the new register into the record
+        snapshot = record.snapshot(account=account, write=False)
         try:
             record.merge_register(new_register)
         except models.ModelException:
             raise APIException("unable to create register object from supplied data")
-        record.save()
+        return snapshot
     
     @classmethod
-    def replace_register(cls, account, record, new_register):
+    def _replace_register(cls, account, record, new_register):
         # check permissions on the account
         if not account.registry_access:
             raise AuthorisationException("This user account does not have permission to overwrite objects in the registry")
@@ -106,43 +323,55 @@ class RegistryAPI(object):
         if len(new_register.keys()) == 0:
             raise APIException("If you want to delete, use the delete endpoint")
         if "register" in new_register:
+            if not isinstance(new_register["register"], dict):
+                raise APIException("register must be a json object")
             if len(new_register["register"].keys()) == 0:
                 raise APIException("If you want to delete, use the delete endpoint")
-
-        # ensure the register object has the right structure
-        if "register" not in new_register:
-            new_register = {"register" : new_register}
-        
-        # prune the third party account data if necessary
-        cls._prune_third_party(account, new_register)
-
-        # clear the created date and last updated date -> the client can't set these, only the system.
-        # they will be merged in from the old version of the record
-        cls._clear_admin_dates(new_register)
         
-        # we may be getting admin data too
-        if "admin" in new_register:
-            if not account.admin_access:
-                raise AuthorisationException("This user account does not have permission to set admin data on the registry")
+        # created date and last updated date will be merged in from the old version of the record
+        new_register = cls._prepare_register(account, new_register)
         
-        # snapshot, then replace the register and save
-        record.snapshot(account=account)
+        # snapshot, then replace the register
+        snapshot = record.snapshot(account=account, write=False)
         try:
             record.replace_register(new_register)
         except models.ModelException:
             raise APIException("unable to create register object from supplied data")
-        record.save()
+        return snapshot
     
     @classmethod
-    def delete_register(cls, account, record):
+    def _delete_register(cls, account, record):
         # check permissions on the account
         if not account.registry_access:
             raise AuthorisationException("This user account does not have permission to delete objects from the registry")
         
         # snapshot and then delete the registry object
-        record.snapshot(account=account)
+        snapshot = record.snapshot(account=account, write=False)
         record.soft_delete()
-        record.save()
+        return snapshot
+    
+    @classmethod
+    def _prepare_register(cls, account, new_register):
+        # ensure the register object has the right structure
+        if "register" not in new_register:
+            new_register = {"register" : new_register}
+        
+        # prune the third party account data if necessary
+        cls._prune_third_party(account, new_register)
+        
+        # fill in any names which can be worked out from the codes supplied
+        if isinstance(new_register.get("register"), dict):
+            lookup.enrich(new_register["register"])
+        
+        # clear the created date and last updated date -> the client can't set these, only the system
+        cls._clear_admin_dates(new_register)
+        
+        # we may be getting admin data too
+        if "admin" in new_register:
+            if not account.admin_access:
+                raise AuthorisationException("This user account does not have permission to set admin data on the registry")
+        
+        return new_register
     
     @classmethod
     def set_admin(cls, account, record, admin):
@@ -153,6 +382,7 @@ class RegistryAPI(object):
         # set the admin record
         record.set_admin(account.name, admin)
         record.save()
+        cls._registry_changed()
     
     @classmethod
     def add_statistic(cls, account, record, raw_stat):
@@ -160,6 +390,76 @@ class RegistryAPI(object):
         if not account.statistics_access:
             raise AuthorisationException("This user account does not have permission to add statistics to the registry")
         
+        # create, populate and save the statistic
+        stat = cls._make_statistic(account, record.id, raw_stat)
+        stat.save()
+        
+        return stat.id
+    
+    @classmethod
+    def add_statistics(cls, account, raw_stats):
+        """
+        Add many statistics at once, each of which must say which record it is about.  Returns a list
+        with the outcome for each statistic, in order, which is either
+        {"status" : 201, "id" : "<statistic id>", "location" : "<url of statistic>"} or
+        {"status" : <http status code>, "error" : "<reason it was not added>"}
+        """
+        # check permissions on the account
+        if not account.statistics_access:
+            raise AuthorisationException("This user account does not have permission to add statistics to the registry")
+        
+        chunk_size = app.config.get("BULK_CHUNK_SIZE", 500)
+        results = []
+        for i in range(0, len(raw_stats), chunk_size):
+            results += cls._add_statistics_chunk(account, raw_stats[i:i + chunk_size])
+        return results
+    
+    @classmethod
+    def _add_statistics_chunk(cls, account, raw_stats):
+        # check that all the records the statistics are about exist in one go
+        abouts = [rs.get("about") for rs in raw_stats if isinstance(rs, dict) and isinstance(rs.get("about"), basestring)]
+        exists = models.Register.exist(abouts)
+        
+        results = []
+        stats = []
+        for raw_stat in raw_stats:
+            if not isinstance(raw_stat, dict):
+                results.append({"status" : 400, "error" : "statistic must be a json object"})
+                continue
+            about = raw_stat.get("about")
+            if about is not None and not isinstance(about, basestring):
+                results.append({"status" : 400, "error" : "about must be a string"})
+                continue
+            if about is None or not exists.get(about, False):
+                results.append({"status" : 404, "error" : "there is no record " + unicode(about)})
+                continue
+            try:
+                stat = cls._make_statistic(account, about, raw_stat)
+            except APIException as e:
+                results.append({"status" : 400, "error" : unicode(e)})
+                continue
+            
+            # mint the id now, so that we can report it back whatever the outcome of the write
+            stat.data["id"] = stat.makeid()
+            results.append(stat)
+            stats.append(stat)
+        
+        outcomes = models.Statistics.save_many(stats)
+        outcomes = dict([(o.get("id"), o) for o in outcomes])
+        
+        for i in range(len(results)):
+            stat = results[i]
+            if not isinstance(stat, models.Statistics):
+                continue
+            error = outcomes.get(stat.id, {"error" : "statistic was not written"}).get("error")
+            if error is not None:
+                results[i] = {"status" : 500, "error" : error}
+            else:
+                results[i] = {"status" : 201, "id" : stat.id, "location" : "/record/" + stat.about + "/stat/" + stat.id}
+        return results
+    
+    @classmethod
+    def _make_statistic(cls, account, about, raw_stat):
         value = raw_stat.get("value")
         type = raw_stat.get("type")
         date = raw_stat.get("date")
@@ -173,16 +473,13 @@ class RegistryAPI(object):
         # values must be a float
         value = cls._numberise(value)
         
-        # create, populate and save the statistic
         stat = models.Statistics()
-        stat.about = record.id
+        stat.about = about
         stat.value = value
         stat.type = type
         stat.date = date
         stat.third_party = account.name
-        stat.save()
-        
-        return stat.id
+        return stat
     
     @classmethod
     def delete_statistic(cls, account, stat, force=False):
@@ -196,6 +493,71 @@ class RegistryAPI(object):
         # delete the stat from the index
         stat.delete()
     
+    @classmethod
+    def _search_query(cls, **kwargs):
+        try:
+            return dao.SearchQuery(**kwargs)
+        except ValueError as e:
+            raise APIException(str(e))
+    
+    @classmethod
+    def _cached_search(cls, search_query):
+        q = search_query.query()
+        current = cls._current_generation()
+        if current is None:
+            # without the generation we can't tell whether cached results are still good, so go to the index
+            es_results = models.Register.query(q=q)
+            cls._add_next_cursor(search_query, es_results)
+            return es_results
+        
+        generation, changed = current
+        key = (generation, json.dumps(q, sort_keys=True))
+        
+        cached = cls._search_cache.get(key)
+        metrics.cache_lookup("query", cached is not None)
+        if cached is not None:
+            return cached
+        
+        es_results = models.Register.query(q=q)
+        cls._add_next_cursor(search_query, es_results)
+        
+        # only cache successful results.  Following a change, we also wait for the index to refresh,
+        # as until then the results may not include it
+        cacheable = "hits" in es_results
+        if cacheable and time.time() - changed > app.config.get("QUERY_CACHE_REFRESH_INTERVAL", 1):
+            cls._search_cache.set(key, es_results, len(json.dumps(es_results)))
+        
+        return es_results
+    
+    @classmethod
+    def _current_generation(cls):
+        # returns (generation, time of the latest change), or None if it can't be read from the index
+        now = time.time()
+        last = cls._generation
+        if last is not None and now - last[2] < app.config.get("QUERY_CACHE_GENERATION_INTERVAL", 1):
+            return last[0], last[1]
+        try:
+            generation, changed = dao.registry_generation()
+        except dao.GenerationException as e:
+            app.logger.warning(unicode(e))
+            return None
+        cls._generation = (generation, changed, now)
+        return generation, changed
+    
+    @classmethod
+    def _registry_changed(cls):
+        dao.registry_changed()
+        # results from earlier generations can no longer be served, so there is no point keeping them,
+        # and this process should see the new generation straight away
+        cls._generation = None
+        cls._search_cache.clear()
+    
+    @classmethod
+    def _add_next_cursor(cls, search_query, es_results):
+        if search_query.cursor is None:
+            return
+        es_results["next_cursor"] = dao.next_cursor(es_results, search_query.size)
+    
     @classmethod
     def _prune_third_party(cls, account, register):
         if "admin" not in register:
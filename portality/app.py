@@ -1,14 +1,14 @@
-from flask import Flask, request, abort, render_template, redirect, make_response, current_app
+from flask import Flask, request, abort, render_template, redirect, make_response, current_app, Response, g
 from flask.views import View
 from functools import wraps
 from flask.ext.login import login_user, current_user
 
 import portality.models as models
-from portality.core import app#, login_manager
-from portality import settings
+from portality.core import app, initialise_index, InitialiseException#, login_manager
+from portality import settings, metrics, profiling
 from portality.api import RegistryAPI, APIException, AuthorisationException
 
-import json
+import json, time, threading, requests
 from datetime import datetime
 
 #from portality.view.account import blueprint as account
@@ -60,6 +60,87 @@ def jsonp(f):
             return f(*args, **kwargs)
     return decorated_function
 
+# whether the index has been initialised by this process
+_index_ready = False
+_index_lock = threading.Lock()
+
+@app.before_request
+def setup_index():
+    # done on the first request rather than at import, so that workers start without talking to the index.
+    # If the index can't be reached yet, it is tried again on the next request, until it succeeds
+    global _index_ready
+    if _index_ready or not app.config.get("INITIALISE_INDEX", False):
+        return
+    with _index_lock:
+        if _index_ready:
+            return
+        try:
+            initialise_index(app)
+        except (InitialiseException, requests.RequestException):
+            app.logger.exception("unable to initialise the index, will try again on the next request")
+            return
+        _index_ready = True
+
+@app.before_request
+def start_timer():
+    g.started = time.time()
+
+@app.before_request
+def start_profile():
+    # superusers can profile any request by adding profile=1, and sample=1 to also sample its stack
+    if request.values.get("profile") != "1":
+        return
+    acc = models.Account.pull_by_auth_token(request.values.get("api_key"))
+    if acc is None or not acc.is_super:
+        return
+    route = request.url_rule.rule if request.url_rule is not None else request.path
+    g.profile = profiling.Profile(request.method + " " + route, sample=request.values.get("sample") == "1")
+    g.profile.start()
+
+@app.after_request
+def finish_profile(response):
+    profile = getattr(g, "profile", None)
+    if profile is None:
+        return response
+    # the profile is only reported here; stop_profile makes sure it is stopped whether or not we get this far
+    profile.stop()
+    report = profile.report(status=response.status_code)
+    stored = profiling.store(report)
+    
+    # the report is returned in place of the response, unless it has been stored, in which case
+    # the response is returned as normal with the name of the report in a header
+    if stored is not None:
+        response.headers["X-Profile-Report"] = stored
+        return response
+    resp = make_response(json.dumps(report, indent=2))
+    resp.mimetype = "application/json"
+    return resp
+
+@app.teardown_request
+def stop_profile(exception):
+    # after_request isn't called if the view raises, and a profile left running would go on profiling
+    # every later request served by the thread
+    profile = getattr(g, "profile", None)
+    if profile is not None:
+        profile.stop()
+
+@app.after_request
+def record_timing(response):
+    started = getattr(g, "started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.request_duration.observe(time.time() - started, route=route, method=request.method, status=response.status_code)
+        # streamed responses (e.g. the dump) have no length until they have been sent
+        length = response.headers.get("Content-Length")
+        if length is not None:
+            metrics.response_size.observe(int(length), route=route)
+        metrics.flush()
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def show_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/")
 def root():
     return render_template("index.html")
@@ -146,6 +227,50 @@ def stats(record_id):
         resp.status_code = 201
         return resp
 
+@app.route("/record/<record_id>/stats/series", methods=["GET"])
+@jsonp
+def stats_series(record_id):
+    interval = request.values.get("interval", "month") # <size of the time buckets>
+    agg = request.values.get("agg", "last") # <how to combine the statistics in each bucket>
+    from_date = request.values.get("from") # <date to provide stats from>
+    until_date = request.values.get("until") # <date to provide stats until>
+    provider = request.values.get("provider") # <name of third party who generated the stats>
+    stat_type = request.values.get("type") # <type of statistic to return>
+    
+    try:
+        series = RegistryAPI.get_statistics_series(record_id, interval=interval, agg=agg, from_date=from_date, until_date=until_date, provider=provider, stat_type=stat_type)
+    except APIException:
+        abort(400)
+    
+    # return a json response
+    resp = make_response(json.dumps(series))
+    resp.mimetype = "application/json"
+    return resp
+
+@app.route("/stats/bulk", methods=["POST"])
+def bulk_stats():
+    # add many statistics at once
+    # check that we are authorised
+    apikey = request.values.get("api_key")
+    acc = models.Account.pull_by_auth_token(apikey)
+    if acc is None:
+        abort(401)
+    
+    raw_stats = _bulk_entries(request.data)
+    if len(raw_stats) == 0:
+        abort(400)
+    
+    try:
+        results = RegistryAPI.add_statistics(acc, raw_stats)
+    except AuthorisationException:
+        abort(401)
+    
+    # return a json response, reporting on each statistic individually
+    created = len([r for r in results if r.get("status") == 201])
+    resp = make_response(json.dumps({"created" : created, "failed" : len(results) - created, "results" : results}))
+    resp.mimetype = "application/json"
+    return resp
+
 @app.route("/record/<record_id>/admin", methods=["PUT"])
 @jsonp
 def admin(record_id):
@@ -198,14 +323,45 @@ def history(record_id):
 def record(record_id):
     
     if request.method == "GET":
+        # a previous version of the record may be requested, either by its version number in the
+        # record's history, or by the date at which it was current
+        as_of = request.values.get("as_of")
+        version = request.values.get("version")
+        if as_of is not None or version is not None:
+            try:
+                if version is not None:
+                    entry = RegistryAPI.get_history_version(record_id, int(version))
+                else:
+                    entry = RegistryAPI.get_registry_entry_as_of(record_id, as_of)
+            except (ValueError, APIException):
+                abort(400)
+            if entry is None:
+                abort(404)
+            resp = make_response(json.dumps(entry))
+            resp.mimetype = "application/json"
+            return resp
+        
+        # if the client already has the current version of the record, we can tell them
+        # so without retrieving the whole thing
+        if request.if_none_match:
+            etag = RegistryAPI.get_registry_etag(record_id)
+            if etag is None:
+                abort(404)
+            if request.if_none_match.contains(etag):
+                resp = make_response("")
+                resp.status_code = 304
+                resp.set_etag(etag)
+                return resp
+        
         # retrieve the record
         # unauthenticated
-        register = RegistryAPI.get_registry_entry(record_id)
+        register, etag = RegistryAPI.get_registry_entry_with_etag(record_id)
         if register is None:
             abort(404)
         # return a json response
         resp = make_response(register.json)
         resp.mimetype = "application/json"
+        resp.set_etag(etag)
         return resp
     
     elif request.method == "POST":
@@ -320,6 +476,80 @@ def create_record():
     resp.status_code = 201
     return resp
 
+@app.route("/records", methods=["GET", "POST"])
+@jsonp
+def records():
+    # the ids may be a comma separated list in the ids parameter, or a json list
+    # (or an object with an "ids" key) in the body of a POST
+    ids = request.values.get("ids")
+    if ids is not None:
+        ids = [i.strip() for i in ids.split(",") if i.strip() != ""]
+    elif request.method == "POST":
+        try:
+            ids = json.loads(request.data)
+        except:
+            abort(400)
+        if isinstance(ids, dict):
+            ids = ids.get("ids")
+    
+    if not isinstance(ids, list) or len(ids) == 0:
+        abort(400)
+    if len(ids) > app.config.get("MAX_BATCH_SIZE", 1000):
+        abort(400)
+    for i in ids:
+        if not isinstance(i, basestring):
+            abort(400)
+    
+    registers = RegistryAPI.get_registry_entries(ids)
+    
+    # report on each requested id in the order they were asked for
+    result = []
+    for i in ids:
+        reg = registers.get(i)
+        if reg is None:
+            result.append({"id" : i, "found" : False})
+        else:
+            result.append({"id" : i, "found" : True, "record" : reg.data})
+    
+    # return a json response
+    resp = make_response(json.dumps(result))
+    resp.mimetype = "application/json"
+    return resp
+
+@app.route("/records/bulk", methods=["POST"])
+def bulk_records():
+    # create, update and delete many records at once
+    # check that we are authorised
+    apikey = request.values.get("api_key")
+    acc = models.Account.pull_by_auth_token(apikey)
+    if acc is None:
+        abort(401)
+    
+    operations = _bulk_entries(request.data)
+    if len(operations) == 0 or len(operations) > app.config.get("MAX_BATCH_SIZE", 1000):
+        abort(400)
+    
+    try:
+        results = RegistryAPI.bulk_register(acc, operations)
+    except AuthorisationException:
+        abort(401)
+    
+    # return a json response, reporting on each operation individually
+    succeeded = len([r for r in results if r.get("status") in [200, 201]])
+    resp = make_response(json.dumps({"succeeded" : succeeded, "failed" : len(results) - succeeded, "results" : results}))
+    resp.mimetype = "application/json"
+    return resp
+
+@app.route("/dump", methods=["GET"])
+def dump():
+    # the type of document to dump; one of register, statistics or history
+    dump_type = request.values.get("type", "register")
+    if dump_type not in RegistryAPI.DUMP_TYPES:
+        abort(400)
+    
+    # stream the documents out as newline-delimited json, one page of the index at a time
+    return Response(RegistryAPI.dump(dump_type), mimetype="application/x-ndjson")
+
 @app.route("/query", methods=["GET"])
 @jsonp
 def query():
@@ -331,6 +561,7 @@ def query():
     fields = request.values.get("fields") # <list of top level fields required>
     from_number = request.values.get("from") # <start result number>
     size = request.values.get("size") # <page size>
+    cursor = request.values.get("cursor") # <cursor token from the previous page, or * for the first page>
 
     # the es argument is an encoded json string
     if es is not None:
@@ -353,7 +584,10 @@ def query():
     if fields is not None:
         fields = [f.strip() for f in fields.split(",") if f.strip() in ["admin", "register"]]
 
-    es_result = RegistryAPI.search(es=es, q=q, fields=fields, from_number=from_number, size=size)
+    try:
+        es_result = RegistryAPI.search(es=es, q=q, fields=fields, from_number=from_number, size=size, cursor=cursor)
+    except APIException:
+        abort(400)
     
     # return a json response
     resp = make_response(json.dumps(es_result))
@@ -367,6 +601,7 @@ def change():
     until_date =  request.values.get("until") # <date to provide changes until>
     from_number = request.values.get("from") # <start result number>
     size = request.values.get("size") # <page size>
+    cursor = request.values.get("cursor") # <cursor token from the previous page, or * for the first page>
     
     # need to check that the dates are correct
     if from_date is not None and not _validate_date(from_date):
@@ -374,13 +609,42 @@ def change():
     if until_date is not None and not _validate_date(until_date):
         abort(400)
     
-    es_result = RegistryAPI.change_list(from_date=from_date, until_date=until_date, from_number=from_number, size=size)
+    # expect size to be an integer
+    try:
+        if size is not None:
+            size = int(size)
+    except:
+        abort(400)
+    
+    try:
+        es_result = RegistryAPI.change_list(from_date=from_date, until_date=until_date, from_number=from_number, size=size, cursor=cursor)
+    except APIException:
+        abort(400)
     
     # return a json response
     resp = make_response(json.dumps(es_result))
     resp.mimetype = "application/json"
     return resp
 
+def _bulk_entries(data):
+    # bulk request bodies may be a json list, or newline-delimited json with one entry per line.  Any
+    # lines which are not valid json are passed on as None, so they can be reported individually
+    try:
+        entries = json.loads(data)
+        return entries if isinstance(entries, list) else [entries]
+    except ValueError:
+        pass
+    
+    entries = []
+    for line in data.splitlines():
+        if line.strip() == "":
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            entries.append(None)
+    return entries
+
 def _validate_date(date):
     try: 
         datetime.strptime("%Y-%m-%dT%H:%M:%SZ", date)
@@ -0,0 +1,118 @@
+"""
+A process-wide pool of keep-alive HTTP connections to the index.  All of the DAOs' requests to ES
+go through here, so that connections are reused rather than set up for every call.
+
+The module-level get, post, put, delete and head functions behave like their counterparts in
+requests, but apply the configured timeout, and retry requests which fail to connect or which
+are turned away by an overloaded server.  Pass retry=False for requests which must not be made
+twice, such as creates, since the index may have carried out a request which it then reported
+as failed.
+"""
+import os, threading, time, requests
+from requests.adapters import HTTPAdapter
+from portality.core import app
+from portality import metrics, profiling
+
+# responses which mean the index could not deal with the request right now, but might shortly
+RETRY_STATUSES = [502, 503, 504]
+
+class ConnectionManager(object):
+    def __init__(self, pool_size=10, timeout=30, retries=2, backoff=0.1):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        # connections must not be shared with a parent process which forked this one (e.g. a
+        # pre-forking web server), so each process gets its own session
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._make_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method, url, retry=True, **kwargs):
+        start = time.time()
+        try:
+            return self._request(method, url, self.retries if retry else 0, **kwargs)
+        finally:
+            profiling.record_es((time.time() - start) * 1000)
+
+    def _request(self, method, url, retries, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            metrics.es_requests.inc(method=method)
+            try:
+                resp = self.session().request(method, url, **kwargs)
+                if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return resp
+            except requests.ConnectionError:
+                if attempt >= retries:
+                    raise
+            metrics.es_retries.inc(method=method)
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("POST", url, data=data, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request("PUT", url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+    def _make_session(self):
+        session = requests.Session()
+        # retries are handled in request, so that they can back off between attempts.  The pinned
+        # requests doesn't take max_retries in the adapter's constructor, so it is set afterwards
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        adapter.max_retries = 0
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+manager = ConnectionManager(
+    pool_size=app.config.get("ES_POOL_SIZE", 10),
+    timeout=app.config.get("ES_TIMEOUT", 30),
+    retries=app.config.get("ES_RETRIES", 2),
+    backoff=app.config.get("ES_RETRY_BACKOFF", 0.1)
+)
+
+def request(method, url, **kwargs):
+    return manager.request(method, url, **kwargs)
+
+def get(url, **kwargs):
+    return manager.get(url, **kwargs)
+
+def post(url, data=None, **kwargs):
+    return manager.post(url, data=data, **kwargs)
+
+def put(url, data=None, **kwargs):
+    return manager.put(url, data=data, **kwargs)
+
+def delete(url, **kwargs):
+    return manager.delete(url, **kwargs)
+
+def head(url, **kwargs):
+    return manager.head(url, **kwargs)
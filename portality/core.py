@@ -1,4 +1,4 @@
-import os, requests, json, esprit
+import os, json, esprit
 from flask import Flask
 
 from portality import settings
@@ -8,7 +8,6 @@ from flask.ext.login import LoginManager, current_user
 def create_app():
     app = Flask(__name__)
     configure_app(app)
-    if app.config.get('INITIALISE_INDEX',False): initialise_index(app)
     setup_error_email(app)
     #login_manager.setup_app(app)
     return app
@@ -22,19 +21,45 @@ def configure_app(app):
         app.config.from_pyfile(config_path)
 
 def initialise_index(app):
+    """
+    Create the index and any of the MAPPINGS types which it does not yet have.  The existing mappings
+    are found with a single request, so this is cheap to call when the index is already set up.
+    Returns the names of the types which were created
+    """
+    # imported here, as the connection module needs the app to be configured
+    from portality import connection
+    
     mappings = app.config["MAPPINGS"]
     i = str(app.config['ELASTIC_SEARCH_HOST']).rstrip('/')
     i += '/' + app.config['ELASTIC_SEARCH_DB']
+    
+    resp = connection.get(i + "/_mapping")     # es 1.x
+    if resp.status_code == 404:
+        # no index, so create it with all of the mappings at once
+        body = {"mappings" : dict([(key, mapping[key]) for key, mapping in mappings.iteritems()])}
+        r = connection.put(i, json.dumps(body))
+        if r.status_code not in [200, 201]:
+            raise InitialiseException("unable to create index: " + str(r.status_code))
+        return sorted(mappings.keys())
+    if resp.status_code != 200:
+        raise InitialiseException("unable to read mappings: " + str(resp.status_code))
+    
+    existing = set()
+    for index in resp.json().values():
+        existing.update(index.get("mappings", {}).keys())
+    
+    created = []
     for key, mapping in mappings.iteritems():
-        # im = i + '/' + key + '/_mapping'  # es 0.x
-        im = i + "/_mapping/" + key         # es 1.x
-        typeurl = i + "/" + key
-        # exists = requests.get(im)         # es 0.x
-        exists = requests.head(typeurl)     # es 1.x
-        if exists.status_code != 200:
-            ri = requests.post(i)
-            r = requests.put(im, json.dumps(mapping))
-            print key, r.status_code
+        if key in existing:
+            continue
+        r = connection.put(i + "/_mapping/" + key, json.dumps(mapping))
+        if r.status_code not in [200, 201]:
+            raise InitialiseException("unable to create mapping for " + key + ": " + str(r.status_code))
+        created.append(key)
+    return sorted(created)
+
+class InitialiseException(Exception):
+    pass
 
 """
 def initialise_index(app):
@@ -1,15 +1,300 @@
-import esprit
+import esprit, threading, time, hashlib, json, base64, requests
 from esprit.models import Query
+from collections import OrderedDict, deque
+from copy import deepcopy
+from datetime import datetime
 from portality.core import app
+from portality import delta, connection, metrics, slowlog
 
-class AccountDAO(esprit.dao.DomainObject):
+# all of the DAOs share a single description of the index
+conn = esprit.raw.Connection(app.config['ELASTIC_SEARCH_HOST'], app.config['ELASTIC_SEARCH_DB'])
+
+class TTLCache(object):
+    """
+    A small thread-safe least-recently-used cache, whose entries also expire after a fixed
+    time-to-live.  If max_bytes is set, the cache also evicts entries to keep the total of the
+    sizes given to set within that budget.  Note that this lives in the memory of a single
+    process, so changes made by other processes will only be seen once the relevant entry has
+    expired.
+    """
+    def __init__(self, max_size, ttl, max_bytes=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value, size = entry
+            if expires < time.time():
+                self.bytes -= size
+                return None
+            # put it back at the most recently used end of the queue
+            self._entries[key] = entry
+            return value
+    
+    def set(self, key, value, size=0):
+        if self.max_size <= 0:
+            return
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.time() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_size or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+    
+    def remove(self, key):
+        with self._lock:
+            self._pop(key)
+    
+    def remove_where(self, predicate):
+        with self._lock:
+            for key in [k for k, (_, v, _) in self._entries.iteritems() if predicate(v)]:
+                self._pop(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+def es_url(type=None, endpoint=None):
+    url = str(app.config['ELASTIC_SEARCH_HOST']).rstrip('/')
+    url += '/' + app.config['ELASTIC_SEARCH_DB']
+    if type is not None:
+        url += "/" + type
+    if endpoint is not None:
+        url += "/" + endpoint
+    return url
+
+def es_host_url(endpoint):
+    return str(app.config['ELASTIC_SEARCH_HOST']).rstrip('/') + "/" + endpoint
+
+def mget(type, ids, source=True):
+    """
+    Get all of the documents of the given type with the given ids in a single request.  Returns a
+    dict of id to document source, in the order of the ids, in which any ids that could not be found
+    map to None.  If source is False, only the existence of the documents is checked, and those which
+    exist map to an empty dict
+    """
+    ids = list(OrderedDict.fromkeys(ids))
+    if len(ids) == 0:
+        return OrderedDict()
+    body = {"ids" : ids}
+    if not source:
+        body["_source"] = False
+    resp = connection.post(es_url(type, "_mget"), data=json.dumps(body))
+    if resp.status_code != 200:
+        raise MultiGetException("unable to retrieve " + type + " documents: " + str(resp.status_code))
+    
+    found = {}
+    for doc in resp.json().get("docs", []):
+        if doc.get("found", False):
+            found[doc.get("_id")] = doc.get("_source", {})
+    return OrderedDict([(id_, found.get(id_)) for id_ in ids])
+
+class MultiGetException(Exception):
+    pass
+
+def bulk(type, docs, chunk_size=None, op_type="index"):
+    """
+    Index the documents of the given type (which must already have ids) using the ES bulk API, chunk_size
+    documents per request.  If op_type is "create", documents whose ids are already in use are not written.
+    Returns a list with the outcome for each document, in order, which is either {"id" : "<id>"} or
+    {"id" : "<id>", "error" : "<reason it was not indexed>", "status" : <http status for the document>}
+    """
+    chunk_size = chunk_size if chunk_size is not None else app.config.get("BULK_CHUNK_SIZE", 500)
+    results = []
+    for i in range(0, len(docs), chunk_size):
+        chunk = docs[i:i + chunk_size]
+        lines = []
+        for doc in chunk:
+            lines.append(json.dumps({op_type : {"_id" : doc["id"]}}))
+            lines.append(json.dumps(doc))
+        # a retried create would find the documents it had already written, and report them as conflicts
+        resp = connection.post(es_url(type, "_bulk"), data="\n".join(lines) + "\n", retry=op_type != "create")
+        if resp.status_code != 200:
+            raise BulkException("unable to index " + type + " documents: " + str(resp.status_code))
+        
+        items = resp.json().get("items", [])
+        for doc, item in zip(chunk, items):
+            outcome = item.get(op_type, {})
+            if outcome.get("error"):
+                results.append({"id" : doc["id"], "error" : unicode(outcome.get("error")), "status" : outcome.get("status")})
+            else:
+                results.append({"id" : doc["id"]})
+    return results
+
+class BulkException(Exception):
+    pass
+
+def stamp(obj, created=True, updated=True):
+    # give a domain object the id and dates which save would give it, for objects which are written with bulk
+    if obj.data.get("id") is None:
+        obj.data["id"] = obj.makeid()
+    now = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+    if created and "created_date" not in obj.data:
+        obj.data["created_date"] = now
+    if updated:
+        obj.data["last_updated"] = now
+
+def scroll(type, q=None, page_size=None, keepalive=None):
+    """
+    Iterate over every document of the given type which matches the query (or all of them, if
+    there is no query), using an ES scan and scroll so that only one page of results is held
+    in memory at a time.  Yields the documents' source objects
+    """
+    page_size = page_size if page_size is not None else app.config.get("SCROLL_PAGE_SIZE", 500)
+    keepalive = keepalive if keepalive is not None else app.config.get("SCROLL_KEEPALIVE", "1m")
+    
+    body = {"query" : {"match_all" : {}}} if q is None else deepcopy(q)
+    body["size"] = page_size
+    for k in ["from", "sort", "fields"]:
+        if k in body:
+            del body[k]
+    
+    resp = connection.post(es_url(type, "_search"), params={"search_type" : "scan", "scroll" : keepalive}, data=json.dumps(body))
+    if resp.status_code != 200:
+        raise ScrollException("unable to start scroll: " + str(resp.status_code))
+    scroll_id = resp.json().get("_scroll_id")
+    
+    try:
+        while True:
+            resp = connection.post(es_host_url("_search/scroll"), params={"scroll" : keepalive}, data=scroll_id)
+            if resp.status_code != 200:
+                raise ScrollException("unable to continue scroll: " + str(resp.status_code))
+            j = resp.json()
+            hits = j.get("hits", {}).get("hits", [])
+            if len(hits) == 0:
+                break
+            scroll_id = j.get("_scroll_id")
+            for hit in hits:
+                yield hit.get("_source")
+    finally:
+        # release the scroll on the server, rather than waiting for it to time out
+        if scroll_id is not None:
+            connection.delete(es_host_url("_search/scroll"), data=scroll_id)
+
+class ScrollException(Exception):
+    pass
+
+# a document which is rewritten on every change to the registry, so that its index version acts as a
+# generation number shared by every process using the index
+_generation_type = "meta"
+_generation_id = "registry_generation"
+
+def registry_generation():
+    """
+    Get the registry's current generation, which moves on with every change to the registry, and the
+    time (in seconds since the epoch) of the latest change, as a tuple.  Unlike a search, this is
+    always up to date
+    """
+    try:
+        resp = connection.get(es_url(_generation_type, _generation_id))
+    except requests.RequestException as e:
+        raise GenerationException("unable to get the registry generation: " + str(e))
+    if resp.status_code == 404:
+        return 0, 0
+    if resp.status_code != 200:
+        raise GenerationException("unable to get the registry generation: " + str(resp.status_code))
+    try:
+        j = resp.json()
+    except ValueError:
+        raise GenerationException("unable to read the registry generation")
+    if not j.get("found", False):
+        return 0, 0
+    return j.get("_version"), j.get("_source", {}).get("changed", 0)
+
+def registry_changed():
+    """
+    Move the registry on to a new generation
+    """
+    resp = connection.put(es_url(_generation_type, _generation_id), data=json.dumps({"changed" : time.time()}))
+    if resp.status_code not in [200, 201]:
+        raise GenerationException("unable to move the registry generation on: " + str(resp.status_code))
+
+class GenerationException(Exception):
+    pass
+
+class DomainObject(esprit.dao.DomainObject):
+    """
+    The esprit domain object, with the requests it makes to the index sent through the shared pool
+    of keep-alive connections in portality.connection.  The conn arguments are accepted for
+    compatibility with esprit, but all requests go to the index in the app's configuration
+    """
+    __conn__ = conn
+    
+    @classmethod
+    @metrics.timed_es("pull")
+    def pull(cls, id_, conn=None):
+        if id_ is None:
+            return None
+        resp = connection.get(es_url(cls.__type__, id_))
+        if resp.status_code != 200:
+            return None
+        j = resp.json()
+        if not j.get("found", False):
+            return None
+        return cls(j.get("_source"))
+    
+    @classmethod
+    @metrics.timed_es("query")
+    def query(cls, q=None, conn=None, **kwargs):
+        body = {"query" : {"match_all" : {}}} if q is None or q == "" else q
+        start = time.time()
+        resp = connection.post(es_url(cls.__type__, "_search"), data=json.dumps(body))
+        result = resp.json()
+        slowlog.check(cls.__type__, body, (time.time() - start) * 1000, result)
+        return result
+    
+    @classmethod
+    @metrics.timed_es("refresh")
+    def refresh(cls, conn=None):
+        connection.post(es_url(endpoint="_refresh"))
+    
+    @metrics.timed_es("save")
+    def save(self, conn=None, created=True, updated=True):
+        stamp(self, created=created, updated=updated)
+        return connection.put(es_url(self.__type__, self.data["id"]), data=json.dumps(self.data))
+    
+    @metrics.timed_es("delete")
+    def delete(self, conn=None):
+        if self.id is None:
+            return None
+        return connection.delete(es_url(self.__type__, self.id))
+
+class AccountDAO(DomainObject):
     __type__ = "account"
-    __conn__ = esprit.raw.Connection(app.config['ELASTIC_SEARCH_HOST'], app.config['ELASTIC_SEARCH_DB'])
+    
+    # resolved account records, keyed by auth token
+    _auth_cache = TTLCache(app.config.get("AUTH_CACHE_SIZE", 1000), app.config.get("AUTH_CACHE_TTL", 60))
     
     @classmethod
     def pull_by_auth_token(cls, auth_token):
         if auth_token is None:
             return None
+        
+        # hand out a copy of the cached record, so that callers can't modify the cache
+        cached = cls._auth_cache.get(auth_token)
+        metrics.cache_lookup("auth", cached is not None)
+        if cached is not None:
+            return cls(deepcopy(cached))
+        
         q = AccountQuery(auth_token=auth_token)
         res = cls.query(q=q.query())
         accs = esprit.raw.unpack_json_result(res)
@@ -17,6 +302,8 @@ class AccountDAO(esprit.dao.DomainObject):
             return None
         if len(accs) > 1:
             raise AccountDAOException("more than one account with that auth_token")
+        
+        cls._auth_cache.set(auth_token, deepcopy(accs[0]))
         return cls(accs[0])
     
     @classmethod
@@ -33,8 +320,21 @@ class AccountDAO(esprit.dao.DomainObject):
         return cls(accs[0])
     
     def save(self, conn=None, created=True, updated=True):
-        # just a shim in case we want to do any tasks before doing the actual save
+        self._invalidate_auth_cache()
         super(AccountDAO, self).save(conn=conn, created=created, updated=updated)
+    
+    def delete(self, conn=None):
+        self._invalidate_auth_cache()
+        super(AccountDAO, self).delete(conn=conn)
+    
+    def _invalidate_auth_cache(self):
+        # the auth token may have been changed since the account was cached, so also
+        # remove anything cached against this account's id
+        token = self.data.get("auth_token")
+        if token is not None:
+            self._auth_cache.remove(token)
+        if self.id is not None:
+            self._auth_cache.remove_where(lambda acc: acc.get("id") == self.id)
 
 class AccountQuery(object):
     def __init__(self, auth_token=None, name=None):
@@ -61,19 +361,99 @@ class AccountDAOException(Exception):
 
 
 
-class RegisterDAO(esprit.dao.DomainObject):
+class RegisterDAO(DomainObject):
     __type__ = "register"
-    __conn__ = esprit.raw.Connection(app.config['ELASTIC_SEARCH_HOST'], app.config['ELASTIC_SEARCH_DB'])
+    
+    @classmethod
+    def from_index(cls, raw):
+        # records in the index were validated when they were written, so need not be validated again
+        return cls(raw, trusted=True)
+    
+    @classmethod
+    def pull(cls, id_, conn=None):
+        result = cls.pull_with_version(id_)
+        return result[0] if result is not None else None
+    
+    @classmethod
+    @metrics.timed_es("pull")
+    def pull_version(cls, id_):
+        """
+        Get the last_updated date and the index version of the record, without retrieving the
+        rest of the record.  Returns a tuple of (last_updated, version), or None if there is no
+        such record
+        """
+        if id_ is None:
+            return None
+        resp = connection.get(es_url(cls.__type__, id_), params={"_source_include" : "last_updated"})
+        if resp.status_code != 200:
+            return None
+        j = resp.json()
+        if not j.get("found", False):
+            return None
+        return j.get("_source", {}).get("last_updated"), j.get("_version")
+    
+    @classmethod
+    @metrics.timed_es("pull")
+    def pull_with_version(cls, id_):
+        """
+        Get the record along with its index version.  Returns a tuple of (record, version), or
+        None if there is no such record
+        """
+        if id_ is None:
+            return None
+        resp = connection.get(es_url(cls.__type__, id_))
+        if resp.status_code != 200:
+            return None
+        j = resp.json()
+        if not j.get("found", False):
+            return None
+        return cls.from_index(j.get("_source")), j.get("_version")
+    
+    @classmethod
+    @metrics.timed_es("pull_many")
+    def pull_many(cls, ids):
+        """
+        Get all of the records with the given ids in a single request.  Returns a dict of id to
+        record, in which any ids that could not be found map to None
+        """
+        docs = mget(cls.__type__, ids)
+        return OrderedDict([(id_, cls.from_index(doc) if doc is not None else None) for id_, doc in docs.iteritems()])
+    
+    @classmethod
+    @metrics.timed_es("exist")
+    def exist(cls, ids):
+        """
+        Check which of the given record ids exist, in a single request.  Returns a dict of id to True or False
+        """
+        docs = mget(cls.__type__, ids, source=False)
+        return OrderedDict([(id_, doc is not None) for id_, doc in docs.iteritems()])
+    
+    @classmethod
+    def make_etag(cls, id_, last_updated, version):
+        # the index version changes on every write to the record, so this is a strong validator
+        # even where two writes happen within the same second
+        tag = u"{id}:{lu}:{v}".format(id=id_, lu=last_updated, v=version)
+        return hashlib.sha1(tag.encode("utf-8")).hexdigest()
     
     def save(self, conn=None, created=True, updated=True):
         # just a shim in case we want to do any tasks before doing the actual save
         super(RegisterDAO, self).save(conn=conn, created=created, updated=updated)
+    
+    @classmethod
+    @metrics.timed_es("save_many")
+    def save_many(cls, records):
+        """
+        Save all of the records using the bulk API.  Returns a list with the outcome for each record,
+        as dao.bulk
+        """
+        for record in records:
+            stamp(record)
+        return bulk(cls.__type__, [record.data for record in records])
 
 
 
-class StatisticsDAO(esprit.dao.DomainObject):
+class StatisticsDAO(DomainObject):
     __type__ = "statistics"
-    __conn__ = esprit.raw.Connection(app.config['ELASTIC_SEARCH_HOST'], app.config['ELASTIC_SEARCH_DB'])
     
     @classmethod
     def list_statistics(cls, record_id, from_date=None, until_date=None, provider=None, stat_type=None):
@@ -82,9 +462,35 @@ class StatisticsDAO(esprit.dao.DomainObject):
         stats = esprit.raw.unpack_json_result(es_results)
         return stats
     
+    @classmethod
+    def statistics_series(cls, record_id, interval, agg, from_date=None, until_date=None, provider=None, stat_type=None):
+        series_query = StatsSeriesQuery(interval, agg, record_id, from_date, until_date, provider, stat_type)
+        es_results = cls.query(q=series_query.query())
+        return series_query.unpack(es_results)
+    
     def save(self, conn=None, created=False, updated=False): # Note that we don't care about last_updated or created_date for stats
         # just a shim in case we want to do any tasks before doing the actual save
         super(StatisticsDAO, self).save(conn=conn, created=created, updated=updated)
+    
+    @classmethod
+    @metrics.timed_es("exist")
+    def exist(cls, ids):
+        """
+        Check which of the given statistic ids exist, in a single request.  Returns a dict of id to True or False
+        """
+        docs = mget(cls.__type__, ids, source=False)
+        return OrderedDict([(id_, doc is not None) for id_, doc in docs.iteritems()])
+    
+    @classmethod
+    @metrics.timed_es("save_many")
+    def save_many(cls, stats):
+        """
+        Save all of the statistics using the bulk API.  Returns a list with the outcome for each
+        statistic, as dao.bulk
+        """
+        for stat in stats:
+            stamp(stat, created=False, updated=False)
+        return bulk(cls.__type__, [stat.data for stat in stats])
 
 class StatsQuery(object):
     def __init__(self, record_id=None, from_date=None, until_date=None, provider=None, stat_type=None):
@@ -122,28 +528,392 @@ class StatsQuery(object):
         
         return q
 
+class StatsSeriesQuery(StatsQuery):
+    """
+    Aggregates the values of the statistics which match the StatsQuery into a time series, bucketed by the
+    interval, with one value per bucket calculated according to agg:
+    
+    max, min, avg, sum - the maximum, minimum, mean or total value of the statistics in the bucket
+    last - the value of the most recent statistic in the bucket
+    """
+    INTERVALS = ["year", "quarter", "month", "week", "day", "hour"]
+    AGGREGATIONS = ["max", "min", "avg", "sum", "last"]
+    
+    def __init__(self, interval, agg, *args, **kwargs):
+        super(StatsSeriesQuery, self).__init__(*args, **kwargs)
+        if interval not in self.INTERVALS:
+            raise ValueError(str(interval) + " is not a valid interval")
+        if agg not in self.AGGREGATIONS:
+            raise ValueError(str(agg) + " is not a valid aggregation")
+        self.interval = interval
+        self.agg = agg
+    
+    def query(self):
+        q = super(StatsSeriesQuery, self).query()
+        
+        # we only want the buckets, not the statistics themselves
+        q["size"] = 0
+        del q["sort"]
+        
+        if self.agg == "last":
+            value_agg = {"top_hits" : {"size" : 1, "sort" : [{"date" : {"order" : "desc"}}], "_source" : {"include" : ["value"]}}}
+        else:
+            value_agg = {self.agg : {"field" : "value"}}
+        
+        q["aggs"] = {
+            "series" : {
+                "date_histogram" : {
+                    "field" : "date",
+                    "interval" : self.interval,
+                    "format" : "yyyy-MM-dd'T'HH:mm:ss'Z'"
+                },
+                "aggs" : {"value" : value_agg}
+            }
+        }
+        return q
+    
+    def unpack(self, es_results):
+        series = []
+        for bucket in es_results.get("aggregations", {}).get("series", {}).get("buckets", []):
+            va = bucket.get("value", {})
+            if self.agg == "last":
+                hits = va.get("hits", {}).get("hits", [])
+                value = hits[0].get("_source", {}).get("value") if len(hits) > 0 else None
+            else:
+                value = va.get("value")
+            series.append({"date" : bucket.get("key_as_string"), "value" : value, "count" : bucket.get("doc_count")})
+        return series
+
 
 
-class HistoryDAO(esprit.dao.DomainObject):
+class HistoryDAO(DomainObject):
+    """
+    History entries are stored as the changes from the previous version of the record where possible,
+    with the full record (a keyframe) stored every HISTORY_KEYFRAME_INTERVAL versions.  Entries are
+    always handed out in full, however they are stored.
+    
+    {
+        "id" : "<id of the record the entry is about>_<version number>",
+        "ver" : <version number of this entry for the record>,
+        "keyframe_ver" : <version number of the last full entry, from which this one can be rebuilt>,
+        "patch" : "<json list of changes from the previous version, if this is not a keyframe>",
+        ... history entry and register stuff ...
+    }
+    
+    Entries made before versioning was introduced have no version number and are always stored in full.
+    """
     __type__ = "history"
-    __conn__ = esprit.raw.Connection(app.config['ELASTIC_SEARCH_HOST'], app.config['ELASTIC_SEARCH_DB'])
+    
+    # fields which describe the history entry itself, rather than the register it records
+    _entry_fields = ["id", "about", "ver", "keyframe_ver", "patch", "triggered_by_account", "created_date", "last_updated", "discarded"]
+    
+    # the maximum number of entries to retrieve for a single record
+    _max_entries = 10000
+    
+    # the number of times to try to place an entry, when other entries for the record keep taking its place
+    _max_attempts = 5
+    
+    @classmethod
+    def entry_id(cls, about, ver):
+        return about + "_" + str(ver)
     
     @classmethod
     def list_history(cls, about, from_date=None, until_date=None):
-        hist_query = HistoryQuery(about, from_date, until_date)
-        es_results = cls.query(q=hist_query.query())
-        h = esprit.raw.unpack_json_result(es_results)
+        hist_query = HistoryQuery(about, from_date, until_date, order="asc", size=cls._max_entries)
+        entries = cls._query_entries(hist_query)
+        if len(entries) == 0:
+            return []
+        
+        # if the earliest entry is stored as changes, we also need the entries back to its keyframe
+        base = []
+        first = entries[0]
+        if "patch" in first:
+            base = cls._chain(about, first.get("keyframe_ver"), first.get("ver") - 1)
+        
+        # discarded entries are needed to rebuild the ones which follow them, but are not part of the history
+        h = [e for e in cls._decode(base + entries)[len(base):] if not e.get("discarded", False)]
+        h.reverse()
         return h
     
+    @classmethod
+    def rebuild_version(cls, about, ver):
+        """
+        Rebuild the given version of the history of a record, or return None if there is no such version
+        """
+        if ver < 1:
+            return None
+        
+        # get the entry along with those preceding it back to where the keyframe should be, all in one go
+        window = mget(cls.__type__, [cls.entry_id(about, v) for v in range(max(ver - cls._keyframe_interval() + 1, 1), ver + 1)]).values()
+        entry = window[-1]
+        if entry is None:
+            return None
+        
+        keyframe_ver = entry.get("keyframe_ver", ver)
+        chain = [e for e in window if e is not None and e.get("ver") >= keyframe_ver]
+        if len(chain) != ver - keyframe_ver + 1:
+            # the keyframe interval must have been larger when this entry was written, so go back for the rest
+            chain = cls._chain(about, keyframe_ver, ver - 1) + [entry]
+        return cls._decode(chain)[-1]
+    
+    @classmethod
+    def rebuild_as_of(cls, about, as_of):
+        """
+        Rebuild the version of a record which was current at the given date, from its history.  Returns
+        None if the record has not changed since that date
+        """
+        # each entry records the state of the record up until the entry was made, so the one we want
+        # is the first one made after the date
+        hist_query = HistoryQuery(about, after_date=as_of, order="asc", size=1, include_discarded=False)
+        entries = cls._query_entries(hist_query)
+        if len(entries) == 0:
+            return None
+        
+        entry = entries[0]
+        if "patch" not in entry:
+            return cls._decode([entry])[-1]
+        return cls._decode(cls._chain(about, entry.get("keyframe_ver"), entry.get("ver") - 1) + [entry])[-1]
+    
     def save(self, conn=None, created=True, updated=True):
-        # just a shim in case we want to do any tasks before doing the actual save
-        super(HistoryDAO, self).save(conn=conn, created=created, updated=updated)
+        # entries which already have a place in the record's history are saved as they are
+        if self.data.get("ver") is None and self.data.get("about") is not None:
+            return self._save_new(created, updated)
+        return super(HistoryDAO, self).save(conn=conn, created=created, updated=updated)
+    
+    def _save_new(self, created, updated):
+        # encode the entry against the record's history, and write it only if nothing else has taken that
+        # version in the meantime.  If something has, the entry is placed again after it
+        original = deepcopy(self.data)
+        for attempt in range(self._max_attempts):
+            self._encode()
+            stamp(self, created=created, updated=updated)
+            resp = self._create()
+            if resp.status_code != 409:
+                return resp
+            self.data.clear()
+            self.data.update(deepcopy(original))
+        raise HistoryDAOException("unable to place a new entry in the history of " + str(original.get("about")))
+    
+    @metrics.timed_es("create")
+    def _create(self):
+        # not retried, as a retry of a create which was carried out would look like a conflict
+        return connection.put(es_url(self.__type__, self.data["id"]), params={"op_type" : "create"}, data=json.dumps(self.data), retry=False)
+    
+    @classmethod
+    @metrics.timed_es("save_many")
+    def save_many(cls, entries):
+        """
+        Save all of the entries using the bulk API, encoding each against the history of its record as
+        save would, but with a fixed number of requests for each entry per record, however many records
+        there are.  Entries for the same record are placed in its history in the order given, and as
+        with save, an entry which finds its place taken is placed again after the entry which took it.
+        Returns a list with the outcome for each entry, as dao.bulk
+        """
+        new = [e for e in entries if e.data.get("ver") is None and e.data.get("about") is not None]
+        fresh = set([id(e) for e in new])
+        old = [e for e in entries if id(e) not in fresh]
+        
+        # each round writes the next entry for every record, so that an entry which loses its place to
+        # another process can be placed again before any entries which follow it
+        queues = OrderedDict()
+        for e in new:
+            queues.setdefault(e.data.get("about"), deque()).append(e)
+        originals = dict([(id(e), deepcopy(e.data)) for e in new])
+        attempts = dict([(id(e), 0) for e in new])
+        outcomes = {}
+        
+        latest, states = cls._current(queues.keys())
+        while len(queues) > 0:
+            batch = [q[0] for q in queues.values()]
+            placed = []
+            for e in batch:
+                about = e.data.get("about")
+                placed.append(cls._state(e.data))
+                cls._place(e.data, latest.get(about), states.get(about))
+                stamp(e)
+            
+            lost = []
+            for e, state, outcome in zip(batch, placed, bulk(cls.__type__, [e.data for e in batch], op_type="create")):
+                about = e.data.get("about")
+                attempts[id(e)] += 1
+                if outcome.get("status") == 409 and attempts[id(e)] < cls._max_attempts:
+                    e.data.clear()
+                    e.data.update(deepcopy(originals[id(e)]))
+                    lost.append(about)
+                    continue
+                outcomes[id(e)] = outcome
+                if "error" not in outcome:
+                    latest[about] = e.data
+                    states[about] = state
+                queues[about].popleft()
+                if len(queues[about]) == 0:
+                    del queues[about]
+            
+            # find out what has been written ahead of the entries which lost their place
+            if len(lost) > 0:
+                l, st = cls._current(lost)
+                latest.update(l)
+                for about in lost:
+                    states.pop(about, None)
+                states.update(st)
+        
+        if len(old) > 0:
+            for e in old:
+                stamp(e)
+            for e, outcome in zip(old, bulk(cls.__type__, [e.data for e in old])):
+                outcomes[id(e)] = outcome
+        return [outcomes[id(e)] for e in entries]
+    
+    @classmethod
+    def discard(cls, entries):
+        """
+        Mark saved entries as discarded, for when the change to the record which they preceded was not
+        made after all.  Discarded entries keep their place in the record's history, as later entries
+        may be stored as changes from them, but are left out of it when it is listed
+        """
+        for e in entries:
+            e.data["discarded"] = True
+        return bulk(cls.__type__, [e.data for e in entries])
+    
+    @classmethod
+    def _current(cls, abouts):
+        # find the latest entry for each record, and rebuild the current state of each record whose next
+        # entry will be stored as changes, with a fixed number of requests
+        latest = cls._latest_entries(abouts)
+        chains = {}
+        for about, entry in latest.iteritems():
+            if entry is not None and not cls._next_is_keyframe(entry):
+                chains[about] = [cls.entry_id(about, v) for v in range(entry.get("keyframe_ver", entry.get("ver")), entry.get("ver") + 1)]
+        found = mget(cls.__type__, [id_ for chain in chains.values() for id_ in chain])
+        states = {}
+        for about, chain in chains.iteritems():
+            chain = [found.get(id_) for id_ in chain]
+            if None in chain:
+                raise HistoryDAOException("history of " + str(about) + " is missing entries before version " + str(latest[about].get("ver")))
+            states[about] = cls._decode(chain)[-1]
+        return latest, states
+    
+    def _encode(self):
+        about = self.data.get("about")
+        latest = self._latest_entry(about)
+        previous = None
+        if latest is not None and not self._next_is_keyframe(latest):
+            previous = self._decode(self._chain(about, latest.get("keyframe_ver", latest.get("ver")), latest.get("ver")))[-1]
+        self._place(self.data, latest, previous)
+    
+    @classmethod
+    def _next_is_keyframe(cls, latest):
+        # the first versioned entry for a record is always a keyframe, as is every interval'th one after
+        if latest is None:
+            return True
+        return latest.get("ver") + 1 - latest.get("keyframe_ver", latest.get("ver")) >= cls._keyframe_interval()
+    
+    @classmethod
+    def _place(cls, data, latest, previous):
+        # give the entry the next version number after the latest entry, and if it is not to be a keyframe
+        # replace its contents with the changes from the previous (full) version of the record
+        about = data.get("about")
+        ver = latest.get("ver") + 1 if latest is not None else 1
+        keyframe_ver = ver if cls._next_is_keyframe(latest) else latest.get("keyframe_ver", latest.get("ver"))
+        data["id"] = cls.entry_id(about, ver)
+        data["ver"] = ver
+        data["keyframe_ver"] = keyframe_ver
+        if keyframe_ver == ver:
+            return
+        
+        changes = delta.diff(cls._state(previous), cls._state(data))
+        entry = dict([(k, v) for k, v in data.iteritems() if k in cls._entry_fields])
+        entry["patch"] = json.dumps(changes)
+        data.clear()
+        data.update(entry)
+    
+    @classmethod
+    def _latest_entry(cls, about):
+        return cls._latest_entries([about]).get(about)
+    
+    @classmethod
+    def _latest_entries(cls, abouts):
+        # find the latest version of each record known to the search, then because the search may not yet
+        # include the most recently written entries, look directly for any which follow them (which, unlike
+        # a search, is up to date).  Returns a dict of record id to its latest entry, or None if it has none
+        latest = OrderedDict([(about, None) for about in abouts])
+        if len(abouts) == 0:
+            return latest
+        
+        version_query = LatestVersionQuery(abouts)
+        known = version_query.unpack(cls.query(q=version_query.query()))
+        pending = dict([(about, known.get(about, 0)) for about in abouts])
+        window = cls._keyframe_interval()
+        while len(pending) > 0:
+            ranges = dict([(about, range(max(ver, 1), ver + window + 1)) for about, ver in pending.iteritems()])
+            found = mget(cls.__type__, [cls.entry_id(about, v) for about, vers in ranges.iteritems() for v in vers])
+            following = {}
+            for about, vers in ranges.iteritems():
+                for v in vers:
+                    entry = found.get(cls.entry_id(about, v))
+                    if entry is None:
+                        break
+                    latest[about] = entry
+                else:
+                    following[about] = vers[-1]
+            pending = following
+        return latest
+    
+    @classmethod
+    def _chain(cls, about, from_ver, until_ver):
+        # get the entries between two versions, in order
+        if until_ver < from_ver:
+            return []
+        entries = mget(cls.__type__, [cls.entry_id(about, v) for v in range(from_ver, until_ver + 1)]).values()
+        if None in entries:
+            raise HistoryDAOException("history of " + str(about) + " is missing entries between versions " + str(from_ver) + " and " + str(until_ver))
+        return entries
+    
+    @classmethod
+    def _decode(cls, entries):
+        # rebuild the full version of each entry in a chain which is in ascending order of version,
+        # and which starts with a full entry
+        state = None
+        full = []
+        for e in entries:
+            if "patch" in e:
+                if state is None:
+                    raise HistoryDAOException("history entry " + str(e.get("id")) + " has no full entry to be rebuilt from")
+                state = delta.apply(state, json.loads(e.get("patch")))
+            else:
+                state = cls._state(e)
+            
+            f = deepcopy(state)
+            for k, v in e.iteritems():
+                if k in cls._entry_fields and k not in ["patch", "keyframe_ver"]:
+                    f[k] = v
+            full.append(f)
+        return full
+    
+    @classmethod
+    def _state(cls, entry):
+        return dict([(k, v) for k, v in entry.iteritems() if k not in cls._entry_fields])
+    
+    @classmethod
+    def _query_entries(cls, hist_query):
+        es_results = cls.query(q=hist_query.query())
+        return esprit.raw.unpack_json_result(es_results)
+    
+    @classmethod
+    def _keyframe_interval(cls):
+        return max(app.config.get("HISTORY_KEYFRAME_INTERVAL", 10), 1)
 
 class HistoryQuery(object):
-    def __init__(self, about, from_date=None, until_date=None):
+    def __init__(self, about, from_date=None, until_date=None, from_ver=None, until_ver=None, order=None, size=None, after_date=None, include_discarded=True):
         self.about = about
+        self.include_discarded = include_discarded
         self.from_date = from_date
         self.until_date = until_date
+        self.after_date = after_date
+        self.from_ver = from_ver
+        self.until_ver = until_ver
+        self.order = order
+        self.size = size
     
     def query(self):
         q = {"query" : {"bool" : {"must" : []}}}
@@ -152,26 +922,102 @@ class HistoryQuery(object):
             aq = {"term" : {"about.exact" : self.about}}
             q["query"]["bool"]["must"].append(aq)
         
-        if self.from_date is not None or self.until_date is not None:
+        if self.from_date is not None or self.until_date is not None or self.after_date is not None:
             rq = {"range" : {"last_updated" : {}}}
             if self.from_date:
                 rq["range"]["last_updated"]["gte"] = self.from_date
+            if self.after_date:
+                rq["range"]["last_updated"]["gt"] = self.after_date
             if self.until_date:
                 rq["range"]["last_updated"]["lte"] = self.until_date
             q["query"]["bool"]["must"].append(rq)
         
-        q["sort"] = {"last_updated" : {"order" : "desc"}}
+        if self.from_ver is not None or self.until_ver is not None:
+            vq = {"range" : {"ver" : {}}}
+            if self.from_ver is not None:
+                vq["range"]["ver"]["gte"] = self.from_ver
+            if self.until_ver is not None:
+                vq["range"]["ver"]["lte"] = self.until_ver
+            q["query"]["bool"]["must"].append(vq)
+        
+        if not self.include_discarded:
+            q["query"]["bool"]["must_not"] = [{"term" : {"discarded" : True}}]
+        
+        if self.size is not None:
+            q["size"] = self.size
+        
+        if self.order is not None:
+            # order by version, with any entries from before versioning was introduced coming earliest
+            missing = "_first" if self.order == "asc" else "_last"
+            q["sort"] = [{"ver" : {"order" : self.order, "missing" : missing}}, {"last_updated" : {"order" : self.order}}]
+        else:
+            q["sort"] = {"last_updated" : {"order" : "desc"}}
         
         return q
 
+class LatestVersionQuery(object):
+    def __init__(self, abouts):
+        self.abouts = abouts
+    
+    def query(self):
+        return {
+            "query" : {"terms" : {"about.exact" : self.abouts}},
+            "size" : 0,
+            "aggs" : {
+                "about" : {
+                    "terms" : {"field" : "about.exact", "size" : len(self.abouts)},
+                    "aggs" : {"ver" : {"max" : {"field" : "ver"}}}
+                }
+            }
+        }
+    
+    def unpack(self, es_results):
+        # entries from before versioning was introduced have no version, so may give no maximum
+        buckets = es_results.get("aggregations", {}).get("about", {}).get("buckets", [])
+        return dict([(b.get("key"), int(b.get("ver", {}).get("value") or 0)) for b in buckets])
+
+class HistoryDAOException(Exception):
+    pass
+
+
+
+# the cursor token which asks for the first page of a cursor-paged result set
+FIRST_CURSOR = "*"
 
+def encode_cursor(sort_values):
+    return base64.urlsafe_b64encode(json.dumps(sort_values))
 
+def decode_cursor(cursor):
+    """
+    Decode a cursor token as issued by encode_cursor.  Raises a ValueError if the cursor
+    is not valid
+    """
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+    except (TypeError, ValueError):
+        raise ValueError("cursor is not valid")
+    if not isinstance(sort_values, list) or len(sort_values) != 2:
+        raise ValueError("cursor is not valid")
+    return sort_values
+
+def next_cursor(es_result, size):
+    """
+    Work out the cursor token for the page after the supplied result set of a cursor-paged
+    query, or None if this was the last page
+    """
+    hits = es_result.get("hits", {}).get("hits", [])
+    if len(hits) == 0 or len(hits) < size:
+        return None
+    return encode_cursor(hits[-1].get("sort"))
 
 class SearchQuery(object):
+    # the size of a cursor-paged result set if none is specified
+    default_cursor_size = 10
+    
     def __init__(self, full_query=None, query_string=None, fields=None, 
                     from_number=None, size=None, 
                     from_date=None, until_date=None,
-                    order=None):
+                    order=None, cursor=None):
         self.full_query = full_query
         self.query_string = query_string
         self.fields = fields
@@ -180,13 +1026,23 @@ class SearchQuery(object):
         self.from_date = from_date
         self.until_date = until_date
         self.order = order if isinstance(order, tuple) and len(order) == 2 else None
+        
+        # if a cursor is requested, decode its sort values (which will fail early if the cursor is
+        # not valid), and page by cursor rather than result number
+        self.cursor = cursor
+        self.after = None
+        if self.cursor is not None:
+            if self.cursor != FIRST_CURSOR:
+                self.after = decode_cursor(self.cursor)
+            if self.size is None:
+                self.size = self.default_cursor_size
     
     def query(self):
         q = None
         
         # full_query overrides query_string, and if neither are set, then match all
         if self.full_query is not None:
-            q = self.full_query
+            q = deepcopy(self.full_query) if self.cursor is not None else self.full_query
         elif self.query_string is not None:
             q = {"query" : {"query_string" : {"query" : Query.escape(self.query_string)}}}
         else:
@@ -203,17 +1059,44 @@ class SearchQuery(object):
         if self.fields is not None:
             q["fields"] = self.fields
         
-        if self.from_number is not None:
+        if self.from_number is not None and self.cursor is None:
             q["from"] = self.from_number
         
         if self.size is not None:
             q["size"] = self.size
         
-        if self.order is not None:
+        if self.cursor is not None:
+            self._cursor_page(q)
+        elif self.order is not None:
             sort_by, direction = self.order
             q["sort"] = {sort_by : {"order" : direction}}
         
         return q
+    
+    def _cursor_page(self, q):
+        # cursor pages are always in a stable order, with the record id breaking any ties on last_updated
+        q["sort"] = [{"last_updated" : {"order" : "asc"}}, {"id.exact" : {"order" : "asc"}}]
+        if "from" in q:
+            del q["from"]
+        
+        if self.after is None:
+            return
+        
+        # restrict the results to those which sort after the last record on the previous page
+        last_updated, id_ = self.after
+        after = {
+            "bool" : {
+                "should" : [
+                    {"range" : {"last_updated" : {"gt" : last_updated}}},
+                    {"bool" : {"must" : [
+                        {"term" : {"last_updated" : last_updated}},
+                        {"range" : {"id.exact" : {"gt" : id_}}}
+                    ]}}
+                ]
+            }
+        }
+        inner = q.get("query", {"match_all" : {}})
+        q["query"] = {"bool" : {"must" : [inner, after]}}
 
 
 
@@ -0,0 +1,111 @@
+"""
+Structural differences between json-like objects (dicts, lists and plain values), expressed as a
+list of JSON-patch style operations:
+
+    {"op" : "add", "path" : "/register/software", "value" : [...]}
+    {"op" : "replace", "path" : "/register/metadata/0/record/name", "value" : "..."}
+    {"op" : "remove", "path" : "/admin/opendoar"}
+
+Paths are JSON pointers, in which "~" and "/" in keys are escaped as "~0" and "~1".
+"""
+from copy import deepcopy
+
+class DeltaException(Exception):
+    pass
+
+def diff(old, new, path=""):
+    """
+    Work out the operations which will turn old into new
+    """
+    ops = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in old.keys():
+            if k not in new:
+                ops.append({"op" : "remove", "path" : path + "/" + _escape(k)})
+        for k, v in new.iteritems():
+            p = path + "/" + _escape(k)
+            if k not in old:
+                ops.append({"op" : "add", "path" : p, "value" : deepcopy(v)})
+            else:
+                ops += diff(old[k], v, p)
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        # lists of the same length are compared item by item, otherwise they are replaced wholesale
+        for i in range(len(old)):
+            ops += diff(old[i], new[i], path + "/" + str(i))
+    elif _differ(old, new):
+        ops.append({"op" : "replace", "path" : path, "value" : deepcopy(new)})
+    return ops
+
+def apply(doc, ops):
+    """
+    Apply the operations to a copy of the document, and return the result
+    """
+    doc = deepcopy(doc)
+    for op in ops:
+        action = op.get("op")
+        keys = _split(op.get("path", ""))
+
+        # operations on the root replace the whole document
+        if len(keys) == 0:
+            if action == "remove":
+                doc = None
+            else:
+                doc = deepcopy(op.get("value"))
+            continue
+
+        parent = doc
+        for k in keys[:-1]:
+            parent = _child(parent, k)
+        last = keys[-1]
+
+        if isinstance(parent, list):
+            idx = len(parent) if last == "-" else _index(last)
+            if action == "add":
+                parent.insert(idx, deepcopy(op.get("value")))
+            elif action == "replace":
+                parent[idx] = deepcopy(op.get("value"))
+            elif action == "remove":
+                del parent[idx]
+            else:
+                raise DeltaException("unknown operation " + str(action))
+        elif isinstance(parent, dict):
+            if action in ["add", "replace"]:
+                parent[last] = deepcopy(op.get("value"))
+            elif action == "remove":
+                if last in parent:
+                    del parent[last]
+            else:
+                raise DeltaException("unknown operation " + str(action))
+        else:
+            raise DeltaException("cannot apply operation at " + op.get("path", ""))
+    return doc
+
+def _differ(a, b):
+    # booleans compare equal to 1 and 0, but we want to keep the distinction
+    if isinstance(a, bool) != isinstance(b, bool):
+        return True
+    return a != b
+
+def _escape(key):
+    return key.replace("~", "~0").replace("/", "~1")
+
+def _split(path):
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise DeltaException("path " + path + " is not a json pointer")
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+def _index(key):
+    try:
+        return int(key)
+    except ValueError:
+        raise DeltaException(key + " is not a list index")
+
+def _child(obj, key):
+    try:
+        if isinstance(obj, list):
+            return obj[_index(key)]
+        return obj[key]
+    except (KeyError, IndexError, TypeError):
+        raise DeltaException("path element " + key + " does not exist")
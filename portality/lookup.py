@@ -0,0 +1,58 @@
+"""
+Country, continent and language names for the codes used in register records.  The tables are
+generated from pycountry and incf.countryutils by portality/scripts/lookuptables.py, so that
+neither of them (nor their databases) needs to be loaded to look the codes up.
+"""
+from portality.lookup_tables import COUNTRIES, LANGUAGES
+
+def country(code):
+    """
+    Get the (country name, continent code, continent name) for a two letter country code, or None
+    if the code is not known.  The continent code and name may be None if it is not known either
+    """
+    if not isinstance(code, basestring):
+        return None
+    return COUNTRIES.get(code.lower())
+
+def language(code):
+    """
+    Get the name of the language with the given two letter code, or None if it is not known
+    """
+    if not isinstance(code, basestring):
+        return None
+    return LANGUAGES.get(code.lower())
+
+def enrich(register):
+    """
+    Fill in any country, continent and language names which are missing from the register, where
+    the register gives the corresponding codes.  Names which are already present are left alone
+    """
+    for m in _list(register.get("metadata")):
+        record = m.get("record") if isinstance(m, dict) else None
+        if not isinstance(record, dict):
+            continue
+        
+        c = country(record.get("country_code"))
+        if c is not None:
+            name, continent_code, continent = c
+            record.setdefault("country", name)
+            if continent_code is not None:
+                record.setdefault("continent_code", continent_code)
+                record.setdefault("continent", continent)
+        
+        codes = record.get("language_code")
+        if isinstance(codes, list) and "language" not in record:
+            names = [language(lc) for lc in codes]
+            if None not in names:
+                record["language"] = names
+    
+    for o in _list(register.get("organisation")):
+        details = o.get("details") if isinstance(o, dict) else None
+        if not isinstance(details, dict):
+            continue
+        c = country(details.get("country_code"))
+        if c is not None:
+            details.setdefault("country", c[0])
+
+def _list(val):
+    return val if isinstance(val, list) else []
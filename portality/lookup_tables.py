@@ -0,0 +1,443 @@
+# generated by portality/scripts/lookuptables.py from pycountry and incf.countryutils - do not edit
+
+# country code : (country name, continent code, continent name)
+COUNTRIES = {
+    'ad' : (u'Andorra', 'eu', 'Europe'),
+    'ae' : (u'United Arab Emirates', 'as', 'Asia'),
+    'af' : (u'Afghanistan', 'as', 'Asia'),
+    'ag' : (u'Antigua and Barbuda', 'na', 'North America'),
+    'ai' : (u'Anguilla', 'na', 'North America'),
+    'al' : (u'Albania', 'eu', 'Europe'),
+    'am' : (u'Armenia', 'as', 'Asia'),
+    'ao' : (u'Angola', 'af', 'Africa'),
+    'aq' : (u'Antarctica', 'an', 'Antarctica'),
+    'ar' : (u'Argentina', 'sa', 'South America'),
+    'as' : (u'American Samoa', 'oc', 'Oceania'),
+    'at' : (u'Austria', 'eu', 'Europe'),
+    'au' : (u'Australia', 'oc', 'Oceania'),
+    'aw' : (u'Aruba', 'na', 'North America'),
+    'ax' : (u'\xc5land Islands', 'eu', 'Europe'),
+    'az' : (u'Azerbaijan', 'as', 'Asia'),
+    'ba' : (u'Bosnia and Herzegovina', 'eu', 'Europe'),
+    'bb' : (u'Barbados', 'na', 'North America'),
+    'bd' : (u'Bangladesh', 'as', 'Asia'),
+    'be' : (u'Belgium', 'eu', 'Europe'),
+    'bf' : (u'Burkina Faso', 'af', 'Africa'),
+    'bg' : (u'Bulgaria', 'eu', 'Europe'),
+    'bh' : (u'Bahrain', 'as', 'Asia'),
+    'bi' : (u'Burundi', 'af', 'Africa'),
+    'bj' : (u'Benin', 'af', 'Africa'),
+    'bl' : (u'Saint Barth\xe9lemy', 'na', 'North America'),
+    'bm' : (u'Bermuda', 'na', 'North America'),
+    'bn' : (u'Brunei Darussalam', 'as', 'Asia'),
+    'bo' : (u'Bolivia, Plurinational State of', 'sa', 'South America'),
+    'bq' : (u'Bonaire, Sint Eustatius and Saba', 'na', 'North America'),
+    'br' : (u'Brazil', 'sa', 'South America'),
+    'bs' : (u'Bahamas', 'na', 'North America'),
+    'bt' : (u'Bhutan', 'as', 'Asia'),
+    'bv' : (u'Bouvet Island', 'an', 'Antarctica'),
+    'bw' : (u'Botswana', 'af', 'Africa'),
+    'by' : (u'Belarus', 'eu', 'Europe'),
+    'bz' : (u'Belize', 'na', 'North America'),
+    'ca' : (u'Canada', 'na', 'North America'),
+    'cc' : (u'Cocos (Keeling) Islands', 'as', 'Asia'),
+    'cd' : (u'Congo, The Democratic Republic of the', 'af', 'Africa'),
+    'cf' : (u'Central African Republic', 'af', 'Africa'),
+    'cg' : (u'Congo', 'af', 'Africa'),
+    'ch' : (u'Switzerland', 'eu', 'Europe'),
+    'ci' : (u"C\xf4te d'Ivoire", 'af', 'Africa'),
+    'ck' : (u'Cook Islands', 'oc', 'Oceania'),
+    'cl' : (u'Chile', 'sa', 'South America'),
+    'cm' : (u'Cameroon', 'af', 'Africa'),
+    'cn' : (u'China', 'as', 'Asia'),
+    'co' : (u'Colombia', 'sa', 'South America'),
+    'cr' : (u'Costa Rica', 'na', 'North America'),
+    'cu' : (u'Cuba', 'na', 'North America'),
+    'cv' : (u'Cape Verde', 'af', 'Africa'),
+    'cw' : (u'Cura\xe7ao', 'na', 'North America'),
+    'cx' : (u'Christmas Island', 'as', 'Asia'),
+    'cy' : (u'Cyprus', 'as', 'Asia'),
+    'cz' : (u'Czech Republic', 'eu', 'Europe'),
+    'de' : (u'Germany', 'eu', 'Europe'),
+    'dj' : (u'Djibouti', 'af', 'Africa'),
+    'dk' : (u'Denmark', 'eu', 'Europe'),
+    'dm' : (u'Dominica', 'na', 'North America'),
+    'do' : (u'Dominican Republic', 'na', 'North America'),
+    'dz' : (u'Algeria', 'af', 'Africa'),
+    'ec' : (u'Ecuador', 'sa', 'South America'),
+    'ee' : (u'Estonia', 'eu', 'Europe'),
+    'eg' : (u'Egypt', 'af', 'Africa'),
+    'eh' : (u'Western Sahara', 'af', 'Africa'),
+    'er' : (u'Eritrea', 'af', 'Africa'),
+    'es' : (u'Spain', 'eu', 'Europe'),
+    'et' : (u'Ethiopia', 'af', 'Africa'),
+    'fi' : (u'Finland', 'eu', 'Europe'),
+    'fj' : (u'Fiji', 'oc', 'Oceania'),
+    'fk' : (u'Falkland Islands (Malvinas)', 'sa', 'South America'),
+    'fm' : (u'Micronesia, Federated States of', 'oc', 'Oceania'),
+    'fo' : (u'Faroe Islands', 'eu', 'Europe'),
+    'fr' : (u'France', 'eu', 'Europe'),
+    'ga' : (u'Gabon', 'af', 'Africa'),
+    'gb' : (u'United Kingdom', 'eu', 'Europe'),
+    'gd' : (u'Grenada', 'na', 'North America'),
+    'ge' : (u'Georgia', 'as', 'Asia'),
+    'gf' : (u'French Guiana', 'sa', 'South America'),
+    'gg' : (u'Guernsey', 'eu', 'Europe'),
+    'gh' : (u'Ghana', 'af', 'Africa'),
+    'gi' : (u'Gibraltar', 'eu', 'Europe'),
+    'gl' : (u'Greenland', 'na', 'North America'),
+    'gm' : (u'Gambia', 'af', 'Africa'),
+    'gn' : (u'Guinea', 'af', 'Africa'),
+    'gp' : (u'Guadeloupe', 'na', 'North America'),
+    'gq' : (u'Equatorial Guinea', 'af', 'Africa'),
+    'gr' : (u'Greece', 'eu', 'Europe'),
+    'gs' : (u'South Georgia and the South Sandwich Islands', 'an', 'Antarctica'),
+    'gt' : (u'Guatemala', 'na', 'North America'),
+    'gu' : (u'Guam', 'oc', 'Oceania'),
+    'gw' : (u'Guinea-Bissau', 'af', 'Africa'),
+    'gy' : (u'Guyana', 'sa', 'South America'),
+    'hk' : (u'Hong Kong', 'as', 'Asia'),
+    'hm' : (u'Heard Island and McDonald Islands', 'an', 'Antarctica'),
+    'hn' : (u'Honduras', 'na', 'North America'),
+    'hr' : (u'Croatia', 'eu', 'Europe'),
+    'ht' : (u'Haiti', 'na', 'North America'),
+    'hu' : (u'Hungary', 'eu', 'Europe'),
+    'id' : (u'Indonesia', 'as', 'Asia'),
+    'ie' : (u'Ireland', 'eu', 'Europe'),
+    'il' : (u'Israel', 'as', 'Asia'),
+    'im' : (u'Isle of Man', 'eu', 'Europe'),
+    'in' : (u'India', 'as', 'Asia'),
+    'io' : (u'British Indian Ocean Territory', 'as', 'Asia'),
+    'iq' : (u'Iraq', 'as', 'Asia'),
+    'ir' : (u'Iran, Islamic Republic of', 'as', 'Asia'),
+    'is' : (u'Iceland', 'eu', 'Europe'),
+    'it' : (u'Italy', 'eu', 'Europe'),
+    'je' : (u'Jersey', 'eu', 'Europe'),
+    'jm' : (u'Jamaica', 'na', 'North America'),
+    'jo' : (u'Jordan', 'as', 'Asia'),
+    'jp' : (u'Japan', 'as', 'Asia'),
+    'ke' : (u'Kenya', 'af', 'Africa'),
+    'kg' : (u'Kyrgyzstan', 'as', 'Asia'),
+    'kh' : (u'Cambodia', 'as', 'Asia'),
+    'ki' : (u'Kiribati', 'oc', 'Oceania'),
+    'km' : (u'Comoros', 'af', 'Africa'),
+    'kn' : (u'Saint Kitts and Nevis', 'na', 'North America'),
+    'kp' : (u"Korea, Democratic People's Republic of", 'as', 'Asia'),
+    'kr' : (u'Korea, Republic of', 'as', 'Asia'),
+    'kw' : (u'Kuwait', 'as', 'Asia'),
+    'ky' : (u'Cayman Islands', 'na', 'North America'),
+    'kz' : (u'Kazakhstan', 'as', 'Asia'),
+    'la' : (u"Lao People's Democratic Republic", 'as', 'Asia'),
+    'lb' : (u'Lebanon', 'as', 'Asia'),
+    'lc' : (u'Saint Lucia', 'na', 'North America'),
+    'li' : (u'Liechtenstein', 'eu', 'Europe'),
+    'lk' : (u'Sri Lanka', 'as', 'Asia'),
+    'lr' : (u'Liberia', 'af', 'Africa'),
+    'ls' : (u'Lesotho', 'af', 'Africa'),
+    'lt' : (u'Lithuania', 'eu', 'Europe'),
+    'lu' : (u'Luxembourg', 'eu', 'Europe'),
+    'lv' : (u'Latvia', 'eu', 'Europe'),
+    'ly' : (u'Libya', 'af', 'Africa'),
+    'ma' : (u'Morocco', 'af', 'Africa'),
+    'mc' : (u'Monaco', 'eu', 'Europe'),
+    'md' : (u'Moldova, Republic of', 'eu', 'Europe'),
+    'me' : (u'Montenegro', 'eu', 'Europe'),
+    'mf' : (u'Saint Martin (French part)', 'na', 'North America'),
+    'mg' : (u'Madagascar', 'af', 'Africa'),
+    'mh' : (u'Marshall Islands', 'oc', 'Oceania'),
+    'mk' : (u'Macedonia, Republic of', 'eu', 'Europe'),
+    'ml' : (u'Mali', 'af', 'Africa'),
+    'mm' : (u'Myanmar', 'as', 'Asia'),
+    'mn' : (u'Mongolia', 'as', 'Asia'),
+    'mo' : (u'Macao', 'as', 'Asia'),
+    'mp' : (u'Northern Mariana Islands', 'oc', 'Oceania'),
+    'mq' : (u'Martinique', 'na', 'North America'),
+    'mr' : (u'Mauritania', 'af', 'Africa'),
+    'ms' : (u'Montserrat', 'na', 'North America'),
+    'mt' : (u'Malta', 'eu', 'Europe'),
+    'mu' : (u'Mauritius', 'af', 'Africa'),
+    'mv' : (u'Maldives', 'as', 'Asia'),
+    'mw' : (u'Malawi', 'af', 'Africa'),
+    'mx' : (u'Mexico', 'na', 'North America'),
+    'my' : (u'Malaysia', 'as', 'Asia'),
+    'mz' : (u'Mozambique', 'af', 'Africa'),
+    'na' : (u'Namibia', 'af', 'Africa'),
+    'nc' : (u'New Caledonia', 'oc', 'Oceania'),
+    'ne' : (u'Niger', 'af', 'Africa'),
+    'nf' : (u'Norfolk Island', 'oc', 'Oceania'),
+    'ng' : (u'Nigeria', 'af', 'Africa'),
+    'ni' : (u'Nicaragua', 'na', 'North America'),
+    'nl' : (u'Netherlands', 'eu', 'Europe'),
+    'no' : (u'Norway', 'eu', 'Europe'),
+    'np' : (u'Nepal', 'as', 'Asia'),
+    'nr' : (u'Nauru', 'oc', 'Oceania'),
+    'nu' : (u'Niue', 'oc', 'Oceania'),
+    'nz' : (u'New Zealand', 'oc', 'Oceania'),
+    'om' : (u'Oman', 'as', 'Asia'),
+    'pa' : (u'Panama', 'na', 'North America'),
+    'pe' : (u'Peru', 'sa', 'South America'),
+    'pf' : (u'French Polynesia', 'oc', 'Oceania'),
+    'pg' : (u'Papua New Guinea', 'oc', 'Oceania'),
+    'ph' : (u'Philippines', 'as', 'Asia'),
+    'pk' : (u'Pakistan', 'as', 'Asia'),
+    'pl' : (u'Poland', 'eu', 'Europe'),
+    'pm' : (u'Saint Pierre and Miquelon', 'na', 'North America'),
+    'pn' : (u'Pitcairn', 'oc', 'Oceania'),
+    'pr' : (u'Puerto Rico', 'na', 'North America'),
+    'ps' : (u'Palestine, State of', 'as', 'Asia'),
+    'pt' : (u'Portugal', 'eu', 'Europe'),
+    'pw' : (u'Palau', 'oc', 'Oceania'),
+    'py' : (u'Paraguay', 'sa', 'South America'),
+    'qa' : (u'Qatar', 'as', 'Asia'),
+    're' : (u'R\xe9union', 'af', 'Africa'),
+    'ro' : (u'Romania', 'eu', 'Europe'),
+    'rs' : (u'Serbia', 'eu', 'Europe'),
+    'ru' : (u'Russian Federation', 'eu', 'Europe'),
+    'rw' : (u'Rwanda', 'af', 'Africa'),
+    'sa' : (u'Saudi Arabia', 'as', 'Asia'),
+    'sb' : (u'Solomon Islands', 'oc', 'Oceania'),
+    'sc' : (u'Seychelles', 'af', 'Africa'),
+    'sd' : (u'Sudan', 'af', 'Africa'),
+    'se' : (u'Sweden', 'eu', 'Europe'),
+    'sg' : (u'Singapore', 'as', 'Asia'),
+    'sh' : (u'Saint Helena, Ascension and Tristan da Cunha', 'af', 'Africa'),
+    'si' : (u'Slovenia', 'eu', 'Europe'),
+    'sj' : (u'Svalbard and Jan Mayen', 'eu', 'Europe'),
+    'sk' : (u'Slovakia', 'eu', 'Europe'),
+    'sl' : (u'Sierra Leone', 'af', 'Africa'),
+    'sm' : (u'San Marino', 'eu', 'Europe'),
+    'sn' : (u'Senegal', 'af', 'Africa'),
+    'so' : (u'Somalia', 'af', 'Africa'),
+    'sr' : (u'Suriname', 'sa', 'South America'),
+    'ss' : (u'South Sudan', 'af', 'Africa'),
+    'st' : (u'Sao Tome and Principe', 'af', 'Africa'),
+    'sv' : (u'El Salvador', 'na', 'North America'),
+    'sx' : (u'Sint Maarten (Dutch part)', 'na', 'North America'),
+    'sy' : (u'Syrian Arab Republic', 'as', 'Asia'),
+    'sz' : (u'Swaziland', 'af', 'Africa'),
+    'tc' : (u'Turks and Caicos Islands', 'na', 'North America'),
+    'td' : (u'Chad', 'af', 'Africa'),
+    'tf' : (u'French Southern Territories', 'an', 'Antarctica'),
+    'tg' : (u'Togo', 'af', 'Africa'),
+    'th' : (u'Thailand', 'as', 'Asia'),
+    'tj' : (u'Tajikistan', 'as', 'Asia'),
+    'tk' : (u'Tokelau', 'oc', 'Oceania'),
+    'tl' : (u'Timor-Leste', 'as', 'Asia'),
+    'tm' : (u'Turkmenistan', 'as', 'Asia'),
+    'tn' : (u'Tunisia', 'af', 'Africa'),
+    'to' : (u'Tonga', 'oc', 'Oceania'),
+    'tr' : (u'Turkey', 'as', 'Asia'),
+    'tt' : (u'Trinidad and Tobago', 'na', 'North America'),
+    'tv' : (u'Tuvalu', 'oc', 'Oceania'),
+    'tw' : (u'Taiwan, Province of China', 'as', 'Asia'),
+    'tz' : (u'Tanzania, United Republic of', 'af', 'Africa'),
+    'ua' : (u'Ukraine', 'eu', 'Europe'),
+    'ug' : (u'Uganda', 'af', 'Africa'),
+    'um' : (u'United States Minor Outlying Islands', 'oc', 'Oceania'),
+    'us' : (u'United States', 'na', 'North America'),
+    'uy' : (u'Uruguay', 'sa', 'South America'),
+    'uz' : (u'Uzbekistan', 'as', 'Asia'),
+    'va' : (u'Holy See (Vatican City State)', 'eu', 'Europe'),
+    'vc' : (u'Saint Vincent and the Grenadines', 'na', 'North America'),
+    've' : (u'Venezuela, Bolivarian Republic of', 'sa', 'South America'),
+    'vg' : (u'Virgin Islands, British', 'na', 'North America'),
+    'vi' : (u'Virgin Islands, U.S.', 'na', 'North America'),
+    'vn' : (u'Viet Nam', 'as', 'Asia'),
+    'vu' : (u'Vanuatu', 'oc', 'Oceania'),
+    'wf' : (u'Wallis and Futuna', 'oc', 'Oceania'),
+    'ws' : (u'Samoa', 'oc', 'Oceania'),
+    'ye' : (u'Yemen', 'as', 'Asia'),
+    'yt' : (u'Mayotte', 'af', 'Africa'),
+    'za' : (u'South Africa', 'af', 'Africa'),
+    'zm' : (u'Zambia', 'af', 'Africa'),
+    'zw' : (u'Zimbabwe', 'af', 'Africa'),
+}
+
+# language code : language name
+LANGUAGES = {
+    'aa' : u'Afar',
+    'ab' : u'Abkhazian',
+    'ae' : u'Avestan',
+    'af' : u'Afrikaans',
+    'ak' : u'Akan',
+    'am' : u'Amharic',
+    'an' : u'Aragonese',
+    'ar' : u'Arabic',
+    'as' : u'Assamese',
+    'av' : u'Avaric',
+    'ay' : u'Aymara',
+    'az' : u'Azerbaijani',
+    'ba' : u'Bashkir',
+    'be' : u'Belarusian',
+    'bg' : u'Bulgarian',
+    'bh' : u'Bihari languages',
+    'bi' : u'Bislama',
+    'bm' : u'Bambara',
+    'bn' : u'Bengali',
+    'bo' : u'Tibetan',
+    'br' : u'Breton',
+    'bs' : u'Bosnian',
+    'ca' : u'Catalan; Valencian',
+    'ce' : u'Chechen',
+    'ch' : u'Chamorro',
+    'co' : u'Corsican',
+    'cr' : u'Cree',
+    'cs' : u'Czech',
+    'cu' : u'Church Slavic; Old Slavonic; Church Slavonic; Old Bulgarian; Old Church Slavonic',
+    'cv' : u'Chuvash',
+    'cy' : u'Welsh',
+    'da' : u'Danish',
+    'de' : u'German',
+    'dv' : u'Divehi; Dhivehi; Maldivian',
+    'dz' : u'Dzongkha',
+    'ee' : u'Ewe',
+    'el' : u'Greek, Modern (1453-)',
+    'en' : u'English',
+    'eo' : u'Esperanto',
+    'es' : u'Spanish; Castilian',
+    'et' : u'Estonian',
+    'eu' : u'Basque',
+    'fa' : u'Persian',
+    'ff' : u'Fulah',
+    'fi' : u'Finnish',
+    'fj' : u'Fijian',
+    'fo' : u'Faroese',
+    'fr' : u'French',
+    'fy' : u'Western Frisian',
+    'ga' : u'Irish',
+    'gd' : u'Gaelic; Scottish Gaelic',
+    'gl' : u'Galician',
+    'gn' : u'Guarani',
+    'gu' : u'Gujarati',
+    'gv' : u'Manx',
+    'ha' : u'Hausa',
+    'he' : u'Hebrew',
+    'hi' : u'Hindi',
+    'ho' : u'Hiri Motu',
+    'hr' : u'Croatian',
+    'ht' : u'Haitian; Haitian Creole',
+    'hu' : u'Hungarian',
+    'hy' : u'Armenian',
+    'hz' : u'Herero',
+    'ia' : u'Interlingua (International Auxiliary Language Association)',
+    'id' : u'Indonesian',
+    'ie' : u'Interlingue; Occidental',
+    'ig' : u'Igbo',
+    'ii' : u'Sichuan Yi; Nuosu',
+    'ik' : u'Inupiaq',
+    'io' : u'Ido',
+    'is' : u'Icelandic',
+    'it' : u'Italian',
+    'iu' : u'Inuktitut',
+    'ja' : u'Japanese',
+    'jv' : u'Javanese',
+    'ka' : u'Georgian',
+    'kg' : u'Kongo',
+    'ki' : u'Kikuyu; Gikuyu',
+    'kj' : u'Kuanyama; Kwanyama',
+    'kk' : u'Kazakh',
+    'kl' : u'Kalaallisut; Greenlandic',
+    'km' : u'Central Khmer',
+    'kn' : u'Kannada',
+    'ko' : u'Korean',
+    'kr' : u'Kanuri',
+    'ks' : u'Kashmiri',
+    'ku' : u'Kurdish',
+    'kv' : u'Komi',
+    'kw' : u'Cornish',
+    'ky' : u'Kirghiz; Kyrgyz',
+    'la' : u'Latin',
+    'lb' : u'Luxembourgish; Letzeburgesch',
+    'lg' : u'Ganda',
+    'li' : u'Limburgan; Limburger; Limburgish',
+    'ln' : u'Lingala',
+    'lo' : u'Lao',
+    'lt' : u'Lithuanian',
+    'lu' : u'Luba-Katanga',
+    'lv' : u'Latvian',
+    'mg' : u'Malagasy',
+    'mh' : u'Marshallese',
+    'mi' : u'Maori',
+    'mk' : u'Macedonian',
+    'ml' : u'Malayalam',
+    'mn' : u'Mongolian',
+    'mo' : u'Moldavian; Moldovan',
+    'mr' : u'Marathi',
+    'ms' : u'Malay',
+    'mt' : u'Maltese',
+    'my' : u'Burmese',
+    'na' : u'Nauru',
+    'nb' : u'Bokm\xe5l, Norwegian; Norwegian Bokm\xe5l',
+    'nd' : u'Ndebele, North; North Ndebele',
+    'ne' : u'Nepali',
+    'ng' : u'Ndonga',
+    'nl' : u'Dutch; Flemish',
+    'nn' : u'Norwegian Nynorsk; Nynorsk, Norwegian',
+    'no' : u'Norwegian',
+    'nr' : u'Ndebele, South; South Ndebele',
+    'nv' : u'Navajo; Navaho',
+    'ny' : u'Chichewa; Chewa; Nyanja',
+    'oc' : u'Occitan (post 1500)',
+    'oj' : u'Ojibwa',
+    'om' : u'Oromo',
+    'or' : u'Oriya',
+    'os' : u'Ossetian; Ossetic',
+    'pa' : u'Panjabi; Punjabi',
+    'pi' : u'Pali',
+    'pl' : u'Polish',
+    'ps' : u'Pushto; Pashto',
+    'pt' : u'Portuguese',
+    'qu' : u'Quechua',
+    'rm' : u'Romansh',
+    'rn' : u'Rundi',
+    'ro' : u'Romanian',
+    'ru' : u'Russian',
+    'rw' : u'Kinyarwanda',
+    'sa' : u'Sanskrit',
+    'sc' : u'Sardinian',
+    'sd' : u'Sindhi',
+    'se' : u'Northern Sami',
+    'sg' : u'Sango',
+    'si' : u'Sinhala; Sinhalese',
+    'sk' : u'Slovak',
+    'sl' : u'Slovenian',
+    'sm' : u'Samoan',
+    'sn' : u'Shona',
+    'so' : u'Somali',
+    'sq' : u'Albanian',
+    'sr' : u'Serbian',
+    'ss' : u'Swati',
+    'st' : u'Sotho, Southern',
+    'su' : u'Sundanese',
+    'sv' : u'Swedish',
+    'sw' : u'Swahili',
+    'ta' : u'Tamil',
+    'te' : u'Telugu',
+    'tg' : u'Tajik',
+    'th' : u'Thai',
+    'ti' : u'Tigrinya',
+    'tk' : u'Turkmen',
+    'tl' : u'Tagalog',
+    'tn' : u'Tswana',
+    'to' : u'Tonga (Tonga Islands)',
+    'tr' : u'Turkish',
+    'ts' : u'Tsonga',
+    'tt' : u'Tatar',
+    'tw' : u'Twi',
+    'ty' : u'Tahitian',
+    'ug' : u'Uighur; Uyghur',
+    'uk' : u'Ukrainian',
+    'ur' : u'Urdu',
+    'uz' : u'Uzbek',
+    've' : u'Venda',
+    'vi' : u'Vietnamese',
+    'vo' : u'Volap\xfck',
+    'wa' : u'Walloon',
+    'wo' : u'Wolof',
+    'xh' : u'Xhosa',
+    'yi' : u'Yiddish',
+    'yo' : u'Yoruba',
+    'za' : u'Zhuang; Chuang',
+    'zh' : u'Chinese',
+    'zu' : u'Zulu',
+}
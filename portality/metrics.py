@@ -0,0 +1,212 @@
+"""
+Counters and histograms of what the application spends its time on, exposed at /metrics in the
+Prometheus text format.
+
+Each process keeps its own metrics in memory.  Where the application is served by more than one
+process, set METRICS_DIR to a directory which they all share; each process then writes its metrics
+to a file of its own there at most every METRICS_FLUSH_INTERVAL seconds, and /metrics reports the
+sum over all of the files, so it gives the same answer whichever process serves it.  Files left by
+processes which have exited are still counted, so that counters never go backwards.
+"""
+import os, json, time, threading, bisect, glob
+from functools import wraps
+from portality.core import app
+
+# seconds
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# bytes
+SIZE_BUCKETS = [100, 1000, 10000, 100000, 1000000, 10000000]
+
+_metrics = []
+
+class Counter(object):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.iteritems()]
+
+    def merge(self, into, state):
+        for k, v in state:
+            k = tuple(k)
+            into[k] = into.get(k, 0) + v
+
+    def render(self, values):
+        lines = []
+        for k in sorted(values.keys()):
+            lines.append(self.name + _labels(self.labels, k) + " " + _number(values[k]))
+        return lines
+
+    def _key(self, labels):
+        return tuple([unicode(labels.get(l, "")) for l in self.labels])
+
+class Histogram(Counter):
+    """
+    The state for each set of labels is the count in each bucket (not cumulative, with an extra
+    bucket for anything larger than the last bound), followed by the sum of the observations
+    """
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DURATION_BUCKETS):
+        super(Histogram, self).__init__(name, doc, labels)
+        self.buckets = list(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1) + [0.0]
+                self._values[key] = counts
+            counts[idx] += 1
+            counts[-1] += value
+
+    def state(self):
+        with self._lock:
+            return [[list(k), list(v)] for k, v in self._values.iteritems()]
+
+    def merge(self, into, state):
+        for k, v in state:
+            k = tuple(k)
+            if k not in into:
+                into[k] = list(v)
+            else:
+                into[k] = [a + b for a, b in zip(into[k], v)]
+
+    def render(self, values):
+        lines = []
+        for k in sorted(values.keys()):
+            counts = values[k]
+            total = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts[:-1]):
+                total += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(self.name + "_bucket" + _labels(self.labels + ("le",), k + (le,)) + " " + _number(total))
+            lines.append(self.name + "_sum" + _labels(self.labels, k) + " " + _number(counts[-1]))
+            lines.append(self.name + "_count" + _labels(self.labels, k) + " " + _number(total))
+        return lines
+
+def _labels(names, values):
+    if len(names) == 0:
+        return ""
+    pairs = []
+    for n, v in zip(names, values):
+        v = unicode(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(n + '="' + v + '"')
+    return "{" + ",".join(pairs) + "}"
+
+def _number(n):
+    if isinstance(n, float):
+        return repr(n)
+    return str(n)
+
+#################################################################
+## The application's metrics
+#################################################################
+
+request_duration = Histogram("oarr_http_request_duration_seconds", "Time taken to serve requests", ["route", "method", "status"])
+response_size = Histogram("oarr_http_response_size_bytes", "Size of response bodies, where known in advance", ["route"], buckets=SIZE_BUCKETS)
+es_duration = Histogram("oarr_es_call_duration_seconds", "Time spent in DAO methods which call the index", ["type", "method"])
+es_requests = Counter("oarr_es_http_requests_total", "HTTP requests made to the index", ["method"])
+es_retries = Counter("oarr_es_http_retries_total", "HTTP requests to the index which were retried", ["method"])
+cache_requests = Counter("oarr_cache_requests_total", "Lookups in in-process caches", ["cache", "result"])
+
+def timed_es(method):
+    """
+    Decorator for DAO methods (and class methods) which call the index, recording the time spent
+    in them against the DAO's type and the given method name
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(obj, *args, **kwargs):
+            start = time.time()
+            try:
+                return f(obj, *args, **kwargs)
+            finally:
+                es_duration.observe(time.time() - start, type=obj.__type__, method=method)
+        return wrapper
+    return decorator
+
+def cache_lookup(cache, hit):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+#################################################################
+## Sharing between processes, and output
+#################################################################
+
+_last_flush = [0]
+_flush_lock = threading.Lock()
+
+# distinguishes this process's file from that of an earlier process which had the same pid
+_started = str(int(time.time()))
+
+def snapshot():
+    return dict([(m.name, m.state()) for m in _metrics])
+
+def flush(force=False):
+    """
+    Write this process's metrics to its file in METRICS_DIR, if it is set and the last write was
+    long enough ago (or force is set)
+    """
+    directory = app.config.get("METRICS_DIR")
+    if directory is None:
+        return
+    now = time.time()
+    if not force and now - _last_flush[0] < app.config.get("METRICS_FLUSH_INTERVAL", 5):
+        return
+    with _flush_lock:
+        _last_flush[0] = now
+        path = os.path.join(directory, str(os.getpid()) + "-" + _started + ".json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot(), f)
+        os.rename(tmp, path)
+
+def collect():
+    """
+    The metrics to report, as a dict of metric name to dict of label values to value, summed over
+    all processes if METRICS_DIR is set
+    """
+    states = []
+    directory = app.config.get("METRICS_DIR")
+    if directory is None:
+        states.append(snapshot())
+    else:
+        flush(force=True)
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            try:
+                with open(path) as f:
+                    states.append(json.load(f))
+            except (IOError, ValueError):
+                # the file is from a process which has gone away mid-write, or is being replaced
+                continue
+
+    merged = dict([(m.name, {}) for m in _metrics])
+    for state in states:
+        for m in _metrics:
+            m.merge(merged[m.name], state.get(m.name, []))
+    return merged
+
+def render():
+    merged = collect()
+    lines = []
+    for m in _metrics:
+        lines.append("# HELP " + m.name + " " + m.doc)
+        lines.append("# TYPE " + m.name + " " + m.kind)
+        lines += m.render(merged[m.name])
+    return "\n".join(lines) + "\n"
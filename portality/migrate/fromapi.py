@@ -1,44 +1,85 @@
-import requests, HTMLParser, csv, json, os
+import requests, HTMLParser, csv, json, os, re, argparse, multiprocessing, threading, hashlib
 from lxml import etree
 import StringIO
-from portality import models
-from portality.core import app # we don't use it, but this ensures the app is initialised
-from incf.countryutils import transformations # need this for continents data
-import pycountry
+from portality import models, dao, lookup
+from portality.core import app, initialise_index
 from datetime import datetime
+from copy import deepcopy
+from collections import deque
 
 BASE_FILE_PATH = os.path.dirname(os.path.realpath(__file__))
 
 h = HTMLParser.HTMLParser()
 
-policy_map_path = os.path.join(BASE_FILE_PATH, "..", "..", "policy_terms_normalised.csv")
-reader = csv.reader(open(policy_map_path))
-policy_map = {}
-instruction_map = {}
-first = True
-for row in reader:
-    if first:
-        first = False
-        continue
-
-    # see if there's a mapping from an old to new, if so record it
-    old = row[0]
-    new = row[3]
-    if new is not None and new.strip() != "":
-        policy_map[old.strip()] = new.strip()
-        continue
-
-    # see if there's a special instruction
-    instruction = row[1]
-    if instruction is not None and instruction.strip() != "":
-        instruction_map[old.strip()] = instruction.strip()
-        parts = instruction.split(":")
-        continue
-
-    # see if we should just keep the existing thing
-    keep = row[2]
-    if keep.lower() == "keep":
-        policy_map[old.strip()] = old.strip()
+POLICY_MAP_PATH = os.path.join(BASE_FILE_PATH, "..", "..", "policy_terms_normalised.csv")
+
+def compile_policies(path):
+    """
+    Read the policy terms csv into a map of OpenDOAR policy terms to the terms they become, and a map
+    of terms to the patches they imply for the record.  Each patch is a list of (path, value) pairs,
+    where the path is a tuple of field names
+    """
+    reader = csv.reader(open(path))
+    policies = {}
+    instructions = {}
+    first = True
+    for row in reader:
+        if first:
+            first = False
+            continue
+        row = [c.decode("utf-8") for c in row]
+
+        # see if there's a mapping from an old to new, if so record it
+        old = row[0]
+        new = row[3]
+        if new is not None and new.strip() != "":
+            policies[old.strip()] = new.strip()
+            continue
+
+        # see if there's a special instruction, of the form field.path:<json value>||field.path:<json value>...
+        instruction = row[1]
+        if instruction is not None and instruction.strip() != "":
+            patch = []
+            for segment in instruction.strip().split("||"):
+                parts = segment.split(":", 1)
+                try:
+                    value = json.loads(parts[1])
+                except ValueError:
+                    value = parts[1]
+                patch.append((tuple(parts[0].split(".")), value))
+            instructions[old.strip()] = patch
+            continue
+
+        # see if we should just keep the existing thing
+        keep = row[2]
+        if keep.lower() == "keep":
+            policies[old.strip()] = old.strip()
+    
+    return policies, instructions
+
+def load_policies(path):
+    """
+    Get the compiled policy maps for the csv, from the cache alongside it if that was compiled from
+    the current version of the csv, otherwise compiling them and updating the cache
+    """
+    cache_path = path + ".compiled.json"
+    mtime = os.path.getmtime(path)
+    try:
+        cache = json.load(open(cache_path))
+        if cache.get("mtime") == mtime:
+            instructions = dict([(k, [(tuple(p), v) for p, v in patch]) for k, patch in cache.get("instructions").iteritems()])
+            return cache.get("policies"), instructions
+    except (IOError, ValueError, AttributeError, TypeError):
+        pass
+    
+    policies, instructions = compile_policies(path)
+    try:
+        json.dump({"mtime" : mtime, "policies" : policies, "instructions" : instructions}, open(cache_path, "w"))
+    except IOError:
+        pass # the cache is just an optimisation, so it doesn't matter if we can't write it
+    return policies, instructions
+
+policy_map, instruction_map = load_policies(POLICY_MAP_PATH)
 
 """
 resp = requests.get("http://opendoar.org/api13.php?all=y&show=max")
@@ -46,11 +87,113 @@ resp = requests.get("http://opendoar.org/api13.php?all=y&show=max")
 f = StringIO.StringIO(resp.text)
 """
 
-path = os.path.join(BASE_FILE_PATH, "..", "..", "opendoar.xml")
-f = open(path)
-xml = etree.parse(f)
-root = xml.getroot()
-repos = root.find("repositories")
+DEFAULT_SOURCE = os.path.join(BASE_FILE_PATH, "..", "..", "opendoar.xml")
+
+# the amount of the source to read and parse at a time
+READ_SIZE = 64 * 1024
+
+# how far back before a checkpoint's offset to look for the last repository it completed
+RESUME_WINDOW = 1024 * 1024
+
+def iter_repos(source, start=None):
+    """
+    Stream the repository elements from an OpenDOAR export, one at a time, so that only the repository
+    currently being migrated is held in memory.  Each element is cleared once the caller has moved on
+    to the next one, so do not hold on to them.
+    
+    Yields (element, offset) tuples, where the offset is how far into the source has been read when
+    the element is complete, so the element ends within the READ_SIZE bytes before it.  If start is
+    given (see resume_point) the repositories before that point in the source are skipped.
+    """
+    f = open(source, "rb")
+    parser = etree.XMLPullParser(events=("end",), tag="repository")
+    offset = 0
+    if start is not None:
+        # parse from the start point as if the repositories before it were not there
+        parser.feed(_prolog(f))
+        f.seek(start)
+        offset = start
+    
+    while True:
+        data = f.read(READ_SIZE)
+        if data == "":
+            break
+        offset += len(data)
+        parser.feed(data)
+        for event, repo in parser.read_events():
+            yield repo, offset
+            
+            # free the element we've finished with, and the references to it held by the parent
+            repo.clear()
+            while repo.getprevious() is not None:
+                del repo.getparent()[0]
+    parser.close()
+    f.close()
+
+def resume_point(source, rid, offset):
+    """
+    Find the position in the source just after the end of the repository with the given rID, which
+    was read by the time iter_repos reached the given offset
+    """
+    if rid is None or offset is None:
+        return None
+    f = open(source, "rb")
+    start = max(0, offset - RESUME_WINDOW)
+    f.seek(start)
+    data = f.read(offset - start)
+    f.close()
+    
+    opening = None
+    for m in re.finditer(r'<repository\s[^>]*\brID="' + re.escape(rid) + '"', data):
+        opening = m
+    if opening is None:
+        return None
+    end = data.find("</repository>", opening.end())
+    if end == -1:
+        return None
+    return start + end + len("</repository>")
+
+def _prolog(f):
+    # everything in the source before the first repository, so that a parse can begin part way through
+    f.seek(0)
+    prolog = ""
+    while True:
+        data = f.read(READ_SIZE)
+        if data == "":
+            raise ValueError("source contains no repositories")
+        prolog += data
+        m = re.search(r"<repository[\s>]", prolog)
+        if m is not None:
+            return prolog[:m.start()]
+
+class Checkpoint(object):
+    """
+    Records how far through the source a migration has got, as the rID of the last repository
+    written to the index and the offset iter_repos had reached when it was read
+    """
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.realpath(source)
+    
+    def load(self):
+        # returns the (rid, offset) to resume from, or None if there is no checkpoint for this source
+        try:
+            cp = json.load(open(self.path))
+        except (IOError, ValueError):
+            return None
+        if cp.get("source") != self.source:
+            return None
+        return cp.get("rid"), cp.get("offset")
+    
+    def save(self, rid, offset):
+        # write to a temporary file first, so a crash part way through the write can't lose the checkpoint
+        tmp = self.path + ".tmp"
+        json.dump({"source" : self.source, "rid" : rid, "offset" : offset}, open(tmp, "w"))
+        os.rename(tmp, self.path)
+    
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
 
 def _extract(repo, field, target_dict, target_field, unescape=False, lower=False, cast=None, aslist=False, append=False, prepend=None):
     el = repo.find(field)
@@ -73,21 +216,23 @@ def _extract(repo, field, target_dict, target_field, unescape=False, lower=False
             else:
                 target_dict[target_field] = val
 
-def _apply(obj, stack, cursor, value):
-    field = stack[cursor]
-    if isinstance(obj, list):
-        for o in obj:
-            _apply(o, stack, cursor, value)
-        return
-    elif isinstance(obj, dict):
-        if cursor + 1 > len(stack) - 1:
-            obj[field] = value
-        else:
-            o = obj.get(field)
-            _apply(o, stack, cursor + 1, value)
-        return
-    else:
-        return
+def _apply(obj, path, value):
+    # set the value at the path, applying the rest of the path to every entry of any lists on the way
+    targets = [obj]
+    for i in range(len(path)):
+        field = path[i]
+        last = i == len(path) - 1
+        following = []
+        while len(targets) > 0:
+            o = targets.pop()
+            if isinstance(o, list):
+                targets.extend(o)
+            elif isinstance(o, dict):
+                if last:
+                    o[field] = deepcopy(value)
+                else:
+                    following.append(o.get(field))
+        targets = following
 
 def migrate_repo(repo):
     # the various components we need to assemble
@@ -142,19 +287,18 @@ def migrate_repo(repo):
     if isocode is not None:
         code = isocode.text
         if code is not None and code != "":
-            try:
+            c = lookup.country(code)
+            if c is not None:
+                country, continent_code, continent = c
+                
                 # specify the continent in the metadata
-                continent_code = transformations.cca_to_ctca2(code)
-                metadata["continent_code"] = continent_code.lower()
-                continent = transformations.cca_to_ctn(code)
-                metadata["continent"] = continent
+                if continent_code is not None:
+                    metadata["continent_code"] = continent_code
+                    metadata["continent"] = continent
 
                 # normalised country name
-                country = pycountry.countries.get(alpha2=code.upper()).name
                 metadata["country"] = country
                 organisation["country"] = country
-            except KeyError:
-                pass
     
     # repository description
     _extract(repo, "rDescription", metadata, "description", unescape=True)
@@ -198,9 +342,10 @@ def migrate_repo(repo):
             code = l.find("lIsoCode")
             if code is not None and code.text != "":
                 lc = code.text.lower()
-                lang = pycountry.languages.get(alpha2=lc).name
-                metadata["language_code"].append(lc)
-                metadata["language"].append(lang)
+                lang = lookup.language(lc)
+                if lang is not None:
+                    metadata["language_code"].append(lc)
+                    metadata["language"].append(lang)
     
     # content types
     ctel = repo.find("contentTypes")
@@ -298,32 +443,237 @@ def migrate_repo(repo):
 
     # apply any additional field patches
     for patch in patches:
-        segments = patch.split("||")
-        for s in segments:
-            parts = s.split(":", 1)
-            field = parts[0]
-            try:
-                value = json.loads(parts[1])
-            except ValueError:
-                value = parts[1]
-            stack = field.split(".")
-            _apply(record, stack, 0, value)
+        for path, value in patch:
+            _apply(record, path, value)
 
     return record, [statistics]
 
-for repo in repos:
-    record, stats = migrate_repo(repo)
-    print record
-    print stats
-    r = models.Register(record)
-    r.save()
-    about = r.id
-    for stat in stats:
-        stat["about"] = about
-        s = models.Statistics(stat)
-        s.save()
+def migrate_xml(xml):
+    # worker processes are handed each repository element serialised, as elements can't be pickled
+    return migrate_repo(etree.fromstring(xml))
+
+def transform(source, workers=1, ordered=True, chunk_size=10, start=None):
+    """
+    Migrate each of the repositories in the source (from the start point, if given), yielding a
+    (record, stats, offset) tuple for each, where offset is as given by iter_repos.  With more than
+    one worker the repositories are migrated in a pool of processes while the source is parsed here,
+    and if ordered is False the results are yielded as soon as they are ready rather than in the
+    order of the source, in which case the offset is not known and is None.
+    """
+    if workers <= 1:
+        for repo, offset in iter_repos(source, start):
+            record, stats = migrate_repo(repo)
+            yield record, stats, offset
+        return
+    
+    # the pool would otherwise read the whole source into its task queue up front, so only let the
+    # parser get a limited distance ahead of the results we have taken
+    window = threading.Semaphore(workers * chunk_size * 4)
+    stopped = threading.Event()
+    offsets = deque()
+    def feed():
+        for repo, offset in iter_repos(source, start):
+            window.acquire()
+            if stopped.is_set():
+                return
+            offsets.append(offset)
+            yield etree.tostring(repo)
+    
+    pool = multiprocessing.Pool(workers)
+    try:
+        mapper = pool.imap if ordered else pool.imap_unordered
+        for record, stats in mapper(migrate_xml, feed(), chunk_size):
+            window.release()
+            offset = offsets.popleft()
+            yield record, stats, offset if ordered else None
+        pool.close()
+    finally:
+        # if we are stopping early the parser may be waiting for room in the window, so let it go
+        stopped.set()
+        window.release()
+        pool.terminate()
+        pool.join()
+
+def build_id_map():
+    """
+    Map the OpenDOAR rID of every repository already in the registry to its record id and the
+    fingerprint it was last imported with, so that a re-import can tell which repositories are
+    new and which have changed
+    """
+    q = {
+        "query" : {"filtered" : {"query" : {"match_all" : {}}, "filter" : {"exists" : {"field" : "admin.opendoar.rid"}}}},
+        "_source" : ["id", "admin.opendoar.rid", "admin.opendoar.fingerprint"]
+    }
+    id_map = {}
+    for doc in dao.scroll(models.Register.__type__, q):
+        opendoar = doc.get("admin", {}).get("opendoar", {})
+        id_map[opendoar.get("rid")] = (doc.get("id"), opendoar.get("fingerprint"))
+    return id_map
+
+def fingerprint(record):
+    # the date the record was migrated changes on every run, so is left out
+    opendoar = dict([(k, v) for k, v in record.get("admin", {}).get("opendoar", {}).iteritems() if k not in ["last_saved", "fingerprint"]])
+    return hashlib.sha1(json.dumps({"register" : record.get("register"), "opendoar" : opendoar}, sort_keys=True)).hexdigest()
+
+def stat_id(stat):
+    # statistics are identified by what they are, so that importing the same one again does not duplicate it
+    key = u"{about}:{tp}:{type}:{date}".format(about=stat.get("about"), tp=stat.get("third_party"), type=stat.get("type"), date=stat.get("date"))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+class Loader(object):
+    """
+    Buffers migrated records and their statistics, and writes them to the index in batches using
+    the bulk API.  Repositories which are already in the registry (according to the id map) are
+    only written if they have changed since they were last imported, in which case they are merged
+    into the existing record, and a snapshot of it is kept in the history.  Record ids for new
+    repositories are minted as they are added, so that the statistics can refer to their record
+    before it has been written.
+    """
+    def __init__(self, batch_size=None, id_map=None, checkpoint=None):
+        self.batch_size = batch_size if batch_size is not None else app.config.get("BULK_CHUNK_SIZE", 500)
+        self.id_map = id_map if id_map is not None else {}
+        self.checkpoint = checkpoint
+        self.position = None
+        self.creates = []
+        self.updates = []
+        self.stats = []
+        self.pending = 0
+        self.loaded = 0
+        self.unchanged = 0
+        self.failed = 0
     
+    def add(self, record, stats, offset=None):
+        rid = record.get("admin", {}).get("opendoar", {}).get("rid")
+        # only a repository with an rID can be found again to resume after
+        if rid is not None:
+            self.position = (rid, offset)
+        fp = fingerprint(record)
+        record.setdefault("admin", {}).setdefault("opendoar", {})["fingerprint"] = fp
+        
+        # a repository without an rID can't be matched to one already imported, so is always new
+        existing = self.id_map.get(rid) if rid is not None else None
+        if existing is not None and existing[1] == fp:
+            about = existing[0]
+            self.unchanged += 1
+        else:
+            try:
+                r = models.Register(record)
+            except models.ModelException as e:
+                print "unable to migrate repository", rid, ":", e
+                self.failed += 1
+                self._next()
+                return
+            if existing is not None:
+                about = existing[0]
+                self.updates.append((about, record))
+            else:
+                about = r.makeid()
+                r.data["id"] = about
+                self.creates.append(r)
+            if rid is not None:
+                self.id_map[rid] = (about, fp)
+        
+        for stat in stats:
+            stat["about"] = about
+            s = models.Statistics(stat)
+            s.data["id"] = stat_id(stat)
+            self.stats.append(s)
+        
+        self._next()
     
+    def _next(self):
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        if self.pending == 0:
+            return
+        registers = self.creates
+        snapshots = []
+        if len(self.updates) > 0:
+            # merge the changes into the existing records, keeping the old versions in the history
+            existing = models.Register.pull_many([about for about, record in self.updates])
+            for about, record in self.updates:
+                current = existing.get(about)
+                if current is None:
+                    current = models.Register(record)
+                    current.data["id"] = about
+                else:
+                    snapshots.append(current.snapshot(write=False))
+                    current.merge_register(record)
+                registers.append(current)
+        
+        if len(snapshots) > 0:
+            self._report(models.History.save_many(snapshots), count=False)
+        if len(registers) > 0:
+            self._report(models.Register.save_many(registers))
+            # so that the app's processes stop serving cached searches from before the migration
+            dao.registry_changed()
+        
+        # only write the statistics we don't already have
+        if len(self.stats) > 0:
+            exists = models.Statistics.exist([s.id for s in self.stats])
+            new_stats = [s for s in self.stats if not exists.get(s.id)]
+            if len(new_stats) > 0:
+                self._report(models.Statistics.save_many(new_stats), count=False)
+        
+        self.creates = []
+        self.updates = []
+        self.stats = []
+        self.pending = 0
+        print "loaded", self.loaded, "repositories,", self.unchanged, "unchanged,", self.failed, "failed"
+        
+        # everything up to the last repository added has now been written
+        if self.checkpoint is not None and self.position is not None and self.position[1] is not None:
+            self.checkpoint.save(*self.position)
+    
+    def _report(self, outcomes, count=True):
+        errors = [o for o in outcomes if o.get("error") is not None]
+        for o in errors:
+            print "unable to index", o.get("id"), ":", o.get("error")
+        if count:
+            self.loaded += len(outcomes) - len(errors)
+            self.failed += len(errors)
+
+def main(source=DEFAULT_SOURCE, batch_size=None, workers=1, ordered=True, checkpoint_path=None, resume=False):
+    # checkpoints need to know which repositories have been written, so can't be used with unordered loading
+    checkpoint = None
+    if ordered:
+        checkpoint = Checkpoint(checkpoint_path if checkpoint_path is not None else source + ".checkpoint", source)
+    
+    start = None
+    if resume:
+        cp = checkpoint.load() if checkpoint is not None else None
+        if cp is None:
+            print "no checkpoint to resume from, starting from the beginning"
+        else:
+            start = resume_point(source, *cp)
+            if start is None:
+                raise ValueError("unable to find repository " + unicode(cp[0]) + " near offset " + unicode(cp[1]) + " in " + source)
+            print "resuming after repository", cp[0]
+    
+    initialise_index(app)
+    loader = Loader(batch_size, build_id_map(), checkpoint)
+    for record, stats, offset in transform(source, workers, ordered, start=start):
+        loader.add(record, stats, offset)
+    loader.flush()
+    
+    # the run is complete, so there is nothing to resume
+    if checkpoint is not None:
+        checkpoint.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate an OpenDOAR export (api13.php?all=y&show=max) into the registry")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE, help="path to the OpenDOAR xml export")
+    parser.add_argument("--batch-size", type=int, help="number of repositories to write to the index in each bulk request")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes to migrate repositories in")
+    parser.add_argument("--unordered", action="store_true", help="load repositories as soon as they are migrated, rather than in the order of the export (disables checkpoints)")
+    parser.add_argument("--checkpoint", help="file to record progress in after each batch (defaults to the source path + .checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="carry on from the last checkpoint, rather than starting from the beginning")
+    args = parser.parse_args()
+    main(args.source, args.batch_size, args.workers, not args.unordered, args.checkpoint, args.resume)
+
 """
 Full record structure
 
@@ -81,7 +81,8 @@ class Account(dao.AccountDAO, UserMixin):
     
     @property
     def is_super(self):
-        return not self.is_anonymous() and self.id in app.config['SUPER_USER']
+        supers = app.config.get('SUPER_USER', [])
+        return not self.is_anonymous() and (self.name in supers or self.id in supers)
         
 
 class Statistics(dao.StatisticsDAO):
@@ -122,12 +123,13 @@ class Statistics(dao.StatisticsDAO):
     def third_party(self, tp): self.data["third_party"] = tp
 
 class Register(dao.RegisterDAO):
-    _root_schema = {
+    # the schemas are compiled once here, as they are used every time a register is created or changed
+    _root_schema = schema.compile_schema({
         "fields" : ["id", "created_date", "last_updated"],
         "objects" : ["register", "admin"]
-    }
+    })
     
-    _register_schema = {
+    _register_schema = schema.compile_schema({
         "fields" : ["replaces", "isreplacedby", "operational_status", "deleted"],
         "lists" : ["metadata", "software", "contact", "organisation", "policy", "api", "integration"],
         "list_entries" : {
@@ -181,7 +183,7 @@ class Register(dao.RegisterDAO):
                 "fields" : ["integrated_with", "nature", "url", "software", "version"]
             }
         }
-    }
+    })
     
     """
     {
@@ -300,10 +302,14 @@ class Register(dao.RegisterDAO):
     # way in which it will be used server-side, so we should just flesh this out
     # as the functions become necessary.
     
-    def __init__(self, raw):
+    def __init__(self, raw, trusted=False):
         # hand to the superclass to do the basic set-up
         super(Register, self).__init__(raw)
-        self._full_validate(self.data)
+        
+        # records which have come from the index were validated when they were written, so only
+        # untrusted data is validated here.  Changes to a record are always validated as they are made
+        if not trusted:
+            self._full_validate(self.data)
     
     @property
     def register(self):
@@ -0,0 +1,156 @@
+"""
+Profiling of individual requests, for diagnosing slow requests in production.  A profile records the
+functions with the highest cumulative time under cProfile, and the time spent waiting on the index
+against the time spent in python.  It may also sample the request's stack at intervals, which shows
+where the time goes without the overhead cProfile adds to every function call.
+
+Only the thread serving the request is profiled, and only up until the response is created, so the
+streaming of a response body (e.g. by the dump) is not included.
+
+    {
+        "route" : "<method and route profiled>",
+        "status" : <status code of the response>,
+        "total_ms" : <time taken to create the response>,
+        "es_ms" : <time spent waiting on requests to the index>,
+        "es_requests" : <number of requests made to the index>,
+        "python_ms" : <the rest of total_ms>,
+        "functions" : [{"function" : "<file:line(name)>", "calls" : <calls>, "tottime_ms" : <time in the function itself>, "cumtime_ms" : <time including calls>}],
+        "samples" : {
+            "interval_ms" : <sampling interval>,
+            "count" : <number of samples taken>,
+            "functions" : [{"function" : "<file:line(name)>", "samples" : <samples in which it was running>}],
+            "stacks" : [{"stack" : ["<outermost function>", ..., "<innermost function>"], "samples" : <samples with this stack>}]
+        }
+    }
+"""
+import cProfile, pstats, threading, time, sys, os, json
+from collections import Counter
+from portality.core import app
+
+_local = threading.local()
+
+class Profile(object):
+    def __init__(self, route, sample=False):
+        self.route = route
+        self.es_ms = 0.0
+        self.es_requests = 0
+        self._profiler = cProfile.Profile()
+        self._sampler = Sampler(threading.current_thread().ident, app.config.get("PROFILE_SAMPLE_INTERVAL", 0.005)) if sample else None
+        self._started = None
+        self._finished = None
+
+    def start(self):
+        _local.profile = self
+        if self._sampler is not None:
+            self._sampler.start()
+        self._started = time.time()
+        self._profiler.enable()
+
+    def stop(self):
+        if self._finished is not None:
+            return
+        self._profiler.disable()
+        self._finished = time.time()
+        if self._sampler is not None:
+            self._sampler.stop()
+        _local.profile = None
+
+    def report(self, status=None, top=None):
+        top = top if top is not None else app.config.get("PROFILE_TOP", 30)
+        total_ms = (self._finished - self._started) * 1000
+        stats = pstats.Stats(self._profiler).stats
+        ranked = sorted(stats.iteritems(), key=lambda s: s[1][3], reverse=True)[:top]
+        report = {
+            "route" : self.route,
+            "status" : status,
+            "total_ms" : round(total_ms, 3),
+            "es_ms" : round(self.es_ms, 3),
+            "es_requests" : self.es_requests,
+            "python_ms" : round(max(total_ms - self.es_ms, 0), 3),
+            "functions" : [{
+                "function" : _function_name(func),
+                "calls" : nc,
+                "tottime_ms" : round(tt * 1000, 3),
+                "cumtime_ms" : round(ct * 1000, 3)
+            } for func, (cc, nc, tt, ct, callers) in ranked]
+        }
+        if self._sampler is not None:
+            report["samples"] = self._sampler.report(top)
+        return report
+
+class Sampler(object):
+    """
+    Records the stack of another thread every interval seconds, from a thread of its own
+    """
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.count = 0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self, top):
+        functions = Counter()
+        for stack, n in self.stacks.iteritems():
+            # count each function once per sample, however many times it appears in the stack
+            for f in set(stack):
+                functions[f] += n
+        return {
+            "interval_ms" : self.interval * 1000,
+            "count" : self.count,
+            "functions" : [{"function" : f, "samples" : n} for f, n in functions.most_common(top)],
+            "stacks" : [{"stack" : list(s), "samples" : n} for s, n in self.stacks.most_common(top)]
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_function_name((code.co_filename, code.co_firstlineno, code.co_name)))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.count += 1
+
+def _function_name(func):
+    filename, line, name = func
+    return "%s:%d(%s)" % (filename, line, name)
+
+def current():
+    return getattr(_local, "profile", None)
+
+def record_es(ms):
+    """
+    Add time spent on a request to the index to the profile of the current request, if it is being profiled
+    """
+    profile = current()
+    if profile is not None:
+        profile.es_ms += ms
+        profile.es_requests += 1
+
+def store(report):
+    """
+    Write the report to a file in PROFILE_DIR, if it is set, and return the file's name
+    """
+    directory = app.config.get("PROFILE_DIR")
+    if directory is None:
+        return None
+    name = "profile-" + time.strftime("%Y%m%dT%H%M%S") + "-" + str(os.getpid()) + "-" + str(threading.current_thread().ident) + ".json"
+    with open(os.path.join(directory, name), "w") as f:
+        json.dump(report, f, indent=2)
+    return name
@@ -1,49 +1,70 @@
 class ObjectSchemaValidationError(Exception):
     pass
 
-def validate(obj, schema):
-    # all fields
-    allowed = schema.get("bools", []) + schema.get("fields", []) + schema.get("lists", []) + schema.get("objects", [])
+# the types which are acceptable as plain fields, and as the entries of lists with no entry schema
+_field_types = frozenset([str, unicode, int, float])
+
+class CompiledSchema(object):
+    """
+    A schema with its field names in sets and its nested schemas compiled, so that it can be used to
+    validate many objects without being re-read each time.  Use compile_schema to create one.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.bools = frozenset(schema.get("bools", []))
+        self.fields = frozenset(schema.get("fields", []))
+        self.lists = frozenset(schema.get("lists", []))
+        self.objects = frozenset(schema.get("objects", []))
+        self.allowed = self.bools | self.fields | self.lists | self.objects
+        self.list_entries = dict([(k, compile_schema(v)) for k, v in schema.get("list_entries", {}).iteritems()])
+        self.object_entries = dict([(k, compile_schema(v)) for k, v in schema.get("object_entries", {}).iteritems()])
     
-    for k, v in obj.iteritems():
-        # is k allowed at all
-        if k not in allowed:
-            raise ObjectSchemaValidationError("object contains key " + k + " which is not permitted by schema")
-        
-        # check the bools are bools
-        if k in schema.get("bools", []):
-            if type(v) != bool:
-                raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected boolean")
-        
-        # check that the fields are plain old strings
-        if k in schema.get("fields", []):
-            if type(v) != str and type(v) != unicode and type(v) != int and type(v) != float:
-                raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected string, unicode or a number")
-        
-        # check that the lists are really lists
-        if k in schema.get("lists", []):
-            if type(v) != list:
-                raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected list")
-            # if it is a list, then for each member validate
-            entry_schema = schema.get("list_entries", {}).get(k)
-            if entry_schema is None:
-                # validate the entries as fields
-                for e in v:
-                    if type(e) != str and type(e) != unicode and type(e) != int and type(e) != float:
-                        raise ObjectSchemaValidationError("list in object contains " + str(type(e)) + " but expected string, unicode or a number in " + k)
-            else:
-                # validate each entry against the schema
-                for e in v:
-                    validate(e, entry_schema)
-        
-        # check that the objects are objects
-        if k in schema.get("objects", []):
-            if type(v) != dict:
-                raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected object/dict")
-            # if it is an object, then validate
-            object_schema = schema.get("object_entries", {}).get(k)
-            if object_schema is None:
-                #raise ObjectSchemaValidationError("no object entry for object " + k)
-                pass # we are not imposing a schema on this object
-            else:
-                validate(v, object_schema)
+    def validate(self, obj):
+        for k, v in obj.iteritems():
+            # is k allowed at all
+            if k not in self.allowed:
+                raise ObjectSchemaValidationError("object contains key " + k + " which is not permitted by schema")
+            
+            # check the bools are bools
+            if k in self.bools:
+                if type(v) != bool:
+                    raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected boolean")
+            
+            # check that the fields are plain old strings
+            if k in self.fields:
+                if type(v) not in _field_types:
+                    raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected string, unicode or a number")
+            
+            # check that the lists are really lists
+            if k in self.lists:
+                if type(v) != list:
+                    raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected list")
+                # if it is a list, then for each member validate
+                entry_schema = self.list_entries.get(k)
+                if entry_schema is None:
+                    # validate the entries as fields
+                    for e in v:
+                        if type(e) not in _field_types:
+                            raise ObjectSchemaValidationError("list in object contains " + str(type(e)) + " but expected string, unicode or a number in " + k)
+                else:
+                    # validate each entry against the schema
+                    for e in v:
+                        entry_schema.validate(e)
+            
+            # check that the objects are objects
+            if k in self.objects:
+                if type(v) != dict:
+                    raise ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected object/dict")
+                # if it is an object, then validate (if there is no entry schema we are not imposing one)
+                object_schema = self.object_entries.get(k)
+                if object_schema is not None:
+                    object_schema.validate(v)
+
+def compile_schema(schema):
+    if isinstance(schema, CompiledSchema):
+        return schema
+    return CompiledSchema(schema)
+
+def validate(obj, schema):
+    # schemas which are used repeatedly should be compiled once up front, rather than on every call
+    compile_schema(schema).validate(obj)
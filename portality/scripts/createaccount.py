@@ -1,4 +1,5 @@
 from portality.models import Account
+from portality.core import app, initialise_index
 import uuid
 
 if __name__ == "__main__":
@@ -27,6 +28,7 @@ if __name__ == "__main__":
     
     token = uuid.uuid4().hex
     
+    initialise_index(app)
     acc = Account.pull_by_name(name)
     if not acc:
         acc = Account()
@@ -0,0 +1,12 @@
+"""
+Create the index and any of the configured index types which it does not yet have.  This is safe
+to run against an index which is already set up, so can be run on every deployment.
+"""
+from portality.core import app, initialise_index
+
+if __name__ == "__main__":
+    created = initialise_index(app)
+    if len(created) == 0:
+        print "index", app.config["ELASTIC_SEARCH_DB"], "is already initialised"
+    for key in created:
+        print "created mapping for", key
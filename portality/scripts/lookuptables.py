@@ -0,0 +1,61 @@
+"""
+Generate portality/lookup_tables.py, the country, continent and language names used by
+portality.lookup, from pycountry and incf.countryutils.  Run this again when either is upgraded.
+"""
+from incf.countryutils import transformations
+import pycountry, os
+
+TARGET = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "lookup_tables.py")
+
+# continents which are set here rather than taken from incf.countryutils, which has no continent for
+# some of the countries and territories in pycountry
+CONTINENT_OVERRIDES = {
+    "aq" : ("an", "Antarctica"),
+    "eh" : ("af", "Africa"),
+    "gs" : ("an", "Antarctica"),
+    "pn" : ("oc", "Oceania"),
+    "sx" : ("na", "North America"),
+    "tf" : ("an", "Antarctica"),
+    "tl" : ("as", "Asia"),
+    "um" : ("oc", "Oceania"),
+    "va" : ("eu", "Europe")
+}
+
+def generate(target=TARGET):
+    countries = {}
+    for c in pycountry.countries:
+        try:
+            continent_code = transformations.cca_to_ctca2(c.alpha2).lower()
+            continent = transformations.cca_to_ctn(c.alpha2)
+        except KeyError:
+            continent_code = None
+            continent = None
+        code = str(c.alpha2.lower())
+        if code in CONTINENT_OVERRIDES:
+            continent_code, continent = CONTINENT_OVERRIDES[code]
+        countries[code] = (c.name, continent_code, continent)
+    
+    languages = {}
+    for l in pycountry.languages:
+        code = getattr(l, "alpha2", None)
+        if code:
+            languages[str(code.lower())] = l.name
+    
+    out = open(target, "w")
+    out.write("# generated by portality/scripts/lookuptables.py from pycountry and incf.countryutils - do not edit\n\n")
+    out.write("# country code : (country name, continent code, continent name)\n")
+    out.write("COUNTRIES = {\n")
+    for code in sorted(countries.keys()):
+        out.write("    " + repr(code) + " : " + repr(countries[code]) + ",\n")
+    out.write("}\n\n")
+    out.write("# language code : language name\n")
+    out.write("LANGUAGES = {\n")
+    for code in sorted(languages.keys()):
+        out.write("    " + repr(code) + " : " + repr(languages[code]) + ",\n")
+    out.write("}\n")
+    out.close()
+    return len(countries), len(languages)
+
+if __name__ == "__main__":
+    c, l = generate()
+    print "generated", c, "countries and", l, "languages"
@@ -20,18 +20,65 @@ PORT = 5001
 # elasticsearch settings
 ELASTIC_SEARCH_HOST = "http://127.0.0.1:9200" # remember the http:// or https://
 ELASTIC_SEARCH_DB = "oarr"
-INITIALISE_INDEX = True # whether or not to try creating the index and required index types on startup
+INITIALISE_INDEX = True # whether or not to create the index and any missing index types when the first request is served, trying again on each request until it succeeds (see also portality/scripts/initialise.py)
+
+# requests to the index share a pool of up to ES_POOL_SIZE keep-alive connections per process.
+# Requests time out after ES_TIMEOUT seconds, and those which fail to connect or are turned away
+# by an overloaded index are retried up to ES_RETRIES times, waiting ES_RETRY_BACKOFF seconds
+# before the first retry and doubling the wait each time after that.  Creates (e.g. of history entries)
+# are never retried, as the index may have carried out one which it reported as failed
+ES_POOL_SIZE = 10
+ES_TIMEOUT = 30
+ES_RETRIES = 2
+ES_RETRY_BACKOFF = 0.1
+
+# accounts resolved from auth tokens are cached in-process for this many seconds, up to
+# AUTH_CACHE_SIZE entries.  Changes to accounts made by other processes (e.g. by the
+# createaccount script) will only be seen once the cached entry expires
+AUTH_CACHE_TTL = 60
+AUTH_CACHE_SIZE = 1000
+
+# request timings, index calls and cache hit rates are reported at /metrics in the Prometheus text
+# format.  When the app is served by several processes, set METRICS_DIR to a directory they all
+# share, and each will write its metrics there every METRICS_FLUSH_INTERVAL seconds so that /metrics
+# reports the total over all of them.  Clear the directory out when the app is redeployed
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5
+
+# queries to the index which take SLOW_QUERY_THRESHOLD milliseconds or more are logged to SLOW_QUERY_LOG,
+# if it is set, which is rotated when it reaches SLOW_QUERY_LOG_SIZE bytes, keeping SLOW_QUERY_LOG_BACKUPS
+# old logs.  Any "{pid}" in the path is replaced with the process id, as processes cannot share a log.
+# Entries are written in the background, and dropped if more than SLOW_QUERY_QUEUE_SIZE are waiting
+SLOW_QUERY_LOG = None
+SLOW_QUERY_THRESHOLD = 1000
+SLOW_QUERY_LOG_SIZE = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+SLOW_QUERY_QUEUE_SIZE = 1000
 
 # list of superuser account names
 # FIXME: port role-based authorisations when necessary
 SUPER_USER = []
 
+# superusers can profile any request by adding profile=1 to it (along with their api_key), and
+# sample=1 to also sample the request's stack every PROFILE_SAMPLE_INTERVAL seconds.  The PROFILE_TOP
+# most expensive functions are reported.  If PROFILE_DIR is set, reports are written there and the
+# response is returned as normal, otherwise the report is returned in place of the response
+PROFILE_DIR = None
+PROFILE_TOP = 30
+PROFILE_SAMPLE_INTERVAL = 0.005
+
 # Can people register publicly? If false, only the superuser can create new accounts
 PUBLIC_REGISTER = False
 
 # can anonymous users get raw JSON records via the query endpoint?
 PUBLIC_ACCESSIBLE_JSON = True 
 
+# maximum number of records which may be requested or written in a single batch request
+MAX_BATCH_SIZE = 1000
+
+# number of documents to write to the index in each request when writing in bulk
+BULK_CHUNK_SIZE = 500
+
 
 # ========================
 # MAPPING SETTINGS
@@ -44,7 +91,13 @@ MAPPINGS = {
     "account" : mappings.for_type("account", mappings.dynamic_templates([mappings.EXACT])),
     "register" : mappings.for_type("register", mappings.dynamic_templates([mappings.EXACT])),
     "statistics" : mappings.for_type("statistics", mappings.dynamic_templates([mappings.EXACT])),
-    "history" : mappings.for_type("history", mappings.dynamic_templates([mappings.EXACT]))
+    "history" : mappings.for_type("history", mappings.dynamic_templates([mappings.EXACT])),
+    "meta" : mappings.for_type("meta", mappings.dynamic_templates([mappings.EXACT]))
+}
+
+# history entries store their changes as a json string, which we never want to search on
+MAPPINGS["history"]["history"]["properties"] = {
+    "patch" : {"type" : "string", "index" : "no"}
 }
 
 # ========================
@@ -69,6 +122,31 @@ DEFAULT_SORT = {
 }
 
 
+# results of searches of the registry are cached in-process, up to QUERY_CACHE_SIZE result sets
+# or QUERY_CACHE_BYTES of serialised results, for at most QUERY_CACHE_TTL seconds.  Every change to
+# the registry, by any process, moves on a generation number kept in the index, which each process
+# reads with a (cheap, realtime) get at most every QUERY_CACHE_GENERATION_INTERVAL seconds, so cached
+# results are served for no longer than that after a change made by another process (a change made
+# by the process itself is seen straight away).  If the generation can't be read, searches go to the
+# index without the cache.  QUERY_CACHE_REFRESH_INTERVAL should be at least the index's refresh
+# interval, as results are not cached for that long after a change
+QUERY_CACHE_SIZE = 500
+QUERY_CACHE_BYTES = 50 * 1024 * 1024
+QUERY_CACHE_TTL = 300
+QUERY_CACHE_GENERATION_INTERVAL = 1
+QUERY_CACHE_REFRESH_INTERVAL = 1
+
+# history entries are stored as the changes from the previous version of the record, with the full
+# record stored every HISTORY_KEYFRAME_INTERVAL versions.  Larger intervals take less space, but mean
+# more entries must be retrieved to rebuild a version
+HISTORY_KEYFRAME_INTERVAL = 10
+
+# number of documents to retrieve per shard on each page of a scroll through the index (e.g. for
+# the dump endpoint), and how long the index should keep the scroll open between pages
+SCROLL_PAGE_SIZE = 500
+SCROLL_KEEPALIVE = "1m"
+
+
 # ========================
 # MEDIA SETTINGS
 
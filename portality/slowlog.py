@@ -0,0 +1,124 @@
+"""
+A log of the queries to the index which take longer than SLOW_QUERY_THRESHOLD milliseconds, written
+to SLOW_QUERY_LOG as one json object per line:
+
+    {"time" : "<when>", "type" : "<index type>", "hash" : "<sha1 of the query>", "took_ms" : <time reported by ES>,
+        "wall_ms" : <time including the request>, "hits" : <total hits>, "route" : "<route which made the query>"}
+
+Entries are handed to a background thread which does the writing, so that logging never holds up a
+request.  If the thread falls behind by more than SLOW_QUERY_QUEUE_SIZE entries, further entries are
+dropped rather than waited for.  The log is rotated when it reaches SLOW_QUERY_LOG_SIZE bytes.  Each
+process needs a file of its own, so any "{pid}" in SLOW_QUERY_LOG is replaced with the process id.
+"""
+import os, json, hashlib, threading, Queue, logging
+from logging.handlers import RotatingFileHandler
+from datetime import datetime
+from flask import request, has_request_context
+from portality.core import app
+
+class SlowQueryLog(object):
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, queue_size=1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = Queue.Queue(queue_size)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def record(self, type, q, wall_ms, result):
+        entry = {
+            "time" : datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "type" : type,
+            "hash" : query_hash(q),
+            "took_ms" : result.get("took") if isinstance(result, dict) else None,
+            "wall_ms" : int(wall_ms),
+            "hits" : result.get("hits", {}).get("total") if isinstance(result, dict) else None,
+            "route" : _route()
+        }
+        self._start()
+        try:
+            self._queue.put_nowait(entry)
+        except Queue.Full:
+            self.dropped += 1
+
+    def wait(self):
+        # block until everything queued so far has been written; for tests and scripts
+        self._queue.join()
+
+    def _start(self):
+        # the writer thread does not survive a fork, so each process starts its own
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._queue = Queue.Queue(self._queue.maxsize)
+            t = threading.Thread(target=self._write, args=(self._queue, self._logger(pid)))
+            t.daemon = True
+            t.start()
+            self._pid = pid
+
+    def _logger(self, pid):
+        logger = logging.getLogger("portality.slowlog." + str(pid))
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        for h in logger.handlers[:]:
+            logger.removeHandler(h)
+        handler = RotatingFileHandler(self.path.replace("{pid}", str(pid)), maxBytes=self.max_bytes, backupCount=self.backups)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        return logger
+
+    def _write(self, queue, logger):
+        while True:
+            entry = queue.get()
+            try:
+                logger.info(json.dumps(entry))
+            except Exception:
+                # a broken log must not take the writer down with it
+                pass
+            finally:
+                queue.task_done()
+
+def query_hash(q):
+    return hashlib.sha1(json.dumps(q, sort_keys=True)).hexdigest()
+
+def _route():
+    if not has_request_context():
+        return None
+    if request.url_rule is not None:
+        return request.method + " " + request.url_rule.rule
+    return request.method + " " + request.path
+
+_log = None
+_log_lock = threading.Lock()
+
+def log():
+    """
+    The slow query log for the app's configuration, or None if it is not turned on
+    """
+    global _log
+    path = app.config.get("SLOW_QUERY_LOG")
+    if path is None:
+        return None
+    if _log is None or _log.path != path:
+        with _log_lock:
+            if _log is None or _log.path != path:
+                _log = SlowQueryLog(path, app.config.get("SLOW_QUERY_LOG_SIZE", 10 * 1024 * 1024),
+                                    app.config.get("SLOW_QUERY_LOG_BACKUPS", 5), app.config.get("SLOW_QUERY_QUEUE_SIZE", 1000))
+    return _log
+
+def check(type, q, wall_ms, result):
+    """
+    Log the query if slow query logging is turned on and it took at least SLOW_QUERY_THRESHOLD
+    milliseconds, either according to the index or including the time taken by the request
+    """
+    threshold = app.config.get("SLOW_QUERY_THRESHOLD", 1000)
+    took = result.get("took", 0) if isinstance(result, dict) else 0
+    if max(wall_ms, took) < threshold:
+        return
+    l = log()
+    if l is not None:
+        l.record(type, q, wall_ms, result)
@@ -0,0 +1,58 @@
+"""
+time the validation of a record which uses all of the fields in the register data model (from
+fullrecord.py) against the register schemas, compiled once up front as Register uses them, and
+as they were used before they could be compiled, with the schema re-read on every call
+
+    python -m tests.benchmark_schema [iterations]
+"""
+import sys, timeit
+from portality import schema
+from portality.models import Register
+from tests.fullrecord import record
+
+def uncompiled_validate(obj, s):
+    # schema.validate as it was, before schemas could be compiled
+    allowed = s.get("bools", []) + s.get("fields", []) + s.get("lists", []) + s.get("objects", [])
+    for k, v in obj.iteritems():
+        if k not in allowed:
+            raise schema.ObjectSchemaValidationError("object contains key " + k + " which is not permitted by schema")
+        if k in s.get("bools", []):
+            if type(v) != bool:
+                raise schema.ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected boolean")
+        if k in s.get("fields", []):
+            if type(v) != str and type(v) != unicode and type(v) != int and type(v) != float:
+                raise schema.ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected string, unicode or a number")
+        if k in s.get("lists", []):
+            if type(v) != list:
+                raise schema.ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected list")
+            entry_schema = s.get("list_entries", {}).get(k)
+            if entry_schema is None:
+                for e in v:
+                    if type(e) != str and type(e) != unicode and type(e) != int and type(e) != float:
+                        raise schema.ObjectSchemaValidationError("list in object contains " + str(type(e)) + " but expected string, unicode or a number in " + k)
+            else:
+                for e in v:
+                    uncompiled_validate(e, entry_schema)
+        if k in s.get("objects", []):
+            if type(v) != dict:
+                raise schema.ObjectSchemaValidationError("object contains " + k + " = " + str(v) + " but expected object/dict")
+            object_schema = s.get("object_entries", {}).get(k)
+            if object_schema is not None:
+                uncompiled_validate(v, object_schema)
+
+def compiled():
+    schema.validate(record, Register._root_schema)
+    schema.validate(record["register"], Register._register_schema)
+
+def uncompiled():
+    uncompiled_validate(record, Register._root_schema.schema)
+    uncompiled_validate(record["register"], Register._register_schema.schema)
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    before = min(timeit.repeat(uncompiled, number=iterations, repeat=3))
+    after = min(timeit.repeat(compiled, number=iterations, repeat=3))
+    print "validations:", iterations
+    print "uncompiled: %.3fs (%.1fus per record)" % (before, before / iterations * 1000000)
+    print "compiled:   %.3fs (%.1fus per record)" % (after, after / iterations * 1000000)
+    print "speedup:    %.2fx" % (before / after)
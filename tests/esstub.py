@@ -0,0 +1,80 @@
+"""
+A stand-in for the index's HTTP interface, which gives canned responses and records the requests
+made to it, so that the requests the DAOs make can be tested without an index
+"""
+from portality import connection
+from portality.core import app
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+import threading
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # the status codes to respond with, in order, after which all responses are 200
+    statuses = []
+
+    # the body of every response, unless there is one in routes for the request's path (without
+    # its query string)
+    body = ""
+    routes = {}
+
+    # the (method, path) and body of every request received
+    received = []
+    bodies = []
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def do_PUT(self):
+        self._respond()
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.bodies.append(self.rfile.read(length) if length > 0 else "")
+        self.received.append((self.command, self.path))
+        status = self.statuses.pop(0) if len(self.statuses) > 0 else 200
+        body = self.routes.get(self.path.split("?")[0], self.body)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+    @classmethod
+    def reset(cls):
+        cls.statuses = []
+        cls.body = ""
+        cls.routes = {}
+        cls.received = []
+        cls.bodies = []
+
+class StubIndex(object):
+    """
+    Serves Handler on a port of its own, and points the app at it until stopped
+    """
+    def __init__(self):
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:" + str(self.server.server_port) + "/"
+        self.port = self.server.server_port
+        self.db = "/" + app.config["ELASTIC_SEARCH_DB"]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self._host = app.config["ELASTIC_SEARCH_HOST"]
+        app.config["ELASTIC_SEARCH_HOST"] = self.url
+
+    def stop(self):
+        if self.server is None:
+            return
+        app.config["ELASTIC_SEARCH_HOST"] = self._host
+        # pooled keep-alive connections would otherwise hold the server open
+        connection.manager.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        Handler.reset()
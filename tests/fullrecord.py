@@ -190,7 +190,8 @@ record = {
     }
 }
 
-from portality.models import Register
-r = Register(record)
-r.save()
-print r.id
\ No newline at end of file
+if __name__ == "__main__":
+    from portality.models import Register
+    r = Register(record)
+    r.save()
+    print r.id
\ No newline at end of file
@@ -0,0 +1,155 @@
+from unittest import TestCase
+from portality import dao
+from portality.api import RegistryAPI
+from portality.core import app
+from tests.esstub import Handler, StubIndex
+import time, json
+
+class TestCache(TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_01_get_set(self):
+        c = dao.TTLCache(10, 60)
+        assert c.get("a") is None
+
+        c.set("a", {"id" : "1"})
+        assert c.get("a") == {"id" : "1"}
+        assert len(c) == 1
+
+        c.remove("a")
+        assert c.get("a") is None
+
+    def test_02_lru_eviction(self):
+        c = dao.TTLCache(2, 60)
+        c.set("a", 1)
+        c.set("b", 2)
+
+        # touch a, so that b becomes the least recently used
+        assert c.get("a") == 1
+        c.set("c", 3)
+
+        assert c.get("a") == 1
+        assert c.get("b") is None
+        assert c.get("c") == 3
+        assert len(c) == 2
+
+    def test_03_expiry(self):
+        c = dao.TTLCache(10, 1)
+        c.set("a", 1)
+        assert c.get("a") == 1
+        time.sleep(1.1)
+        assert c.get("a") is None
+        assert len(c) == 0
+
+    def test_04_remove_where(self):
+        c = dao.TTLCache(10, 60)
+        c.set("token1", {"id" : "1"})
+        c.set("token2", {"id" : "2"})
+
+        c.remove_where(lambda acc: acc.get("id") == "1")
+
+        assert c.get("token1") is None
+        assert c.get("token2") == {"id" : "2"}
+
+    def test_05_byte_budget(self):
+        c = dao.TTLCache(10, 60, max_bytes=100)
+        c.set("a", 1, 40)
+        c.set("b", 2, 40)
+        assert c.bytes == 80
+
+        # adding another entry takes us over budget, so the least recently used goes
+        c.set("c", 3, 40)
+        assert c.get("a") is None
+        assert c.get("b") == 2
+        assert c.get("c") == 3
+        assert c.bytes == 80
+
+        # an entry which could never fit is not cached at all
+        c.set("d", 4, 101)
+        assert c.get("d") is None
+        assert c.bytes == 80
+
+        # replacing and removing entries keeps the byte count right
+        c.set("b", 5, 10)
+        assert c.bytes == 50
+        c.remove("c")
+        assert c.bytes == 10
+        c.clear()
+        assert c.bytes == 0
+
+    def test_06_search_invalidation(self):
+        index = StubIndex()
+        search = index.db + "/register/_search"
+        generation = index.db + "/meta/registry_generation"
+        refresh = app.config["QUERY_CACHE_REFRESH_INTERVAL"]
+        interval = app.config["QUERY_CACHE_GENERATION_INTERVAL"]
+        try:
+            RegistryAPI._search_cache.clear()
+            RegistryAPI._generation = None
+            app.config["QUERY_CACHE_REFRESH_INTERVAL"] = 1
+            # read the generation before every search
+            app.config["QUERY_CACHE_GENERATION_INTERVAL"] = 0
+            Handler.routes[search] = json.dumps({"hits" : {"total" : 1, "hits" : []}})
+
+            # a change made long enough ago for the index to include it
+            Handler.routes[generation] = json.dumps({"found" : True, "_version" : 3, "_source" : {"changed" : time.time() - 10}})
+            RegistryAPI.search(q="repository")
+            RegistryAPI.search(q="repository")
+            assert [r for r in Handler.received if r[1].startswith(search)] == [("POST", search)]
+
+            # another process changes the registry, which this one only finds out about from the index
+            Handler.routes[generation] = json.dumps({"found" : True, "_version" : 4, "_source" : {"changed" : time.time()}})
+            RegistryAPI.search(q="repository")
+            assert len([r for r in Handler.received if r[1].startswith(search)]) == 2
+
+            # until the index has refreshed, results are not cached
+            RegistryAPI.search(q="repository")
+            assert len([r for r in Handler.received if r[1].startswith(search)]) == 3
+
+            # a change through this process moves the shared generation on
+            Handler.received = []
+            RegistryAPI._registry_changed()
+            assert Handler.received == [("PUT", generation)]
+        finally:
+            app.config["QUERY_CACHE_REFRESH_INTERVAL"] = refresh
+            app.config["QUERY_CACHE_GENERATION_INTERVAL"] = interval
+            RegistryAPI._search_cache.clear()
+            RegistryAPI._generation = None
+            index.stop()
+
+    def test_07_generation_interval(self):
+        index = StubIndex()
+        search = index.db + "/register/_search"
+        generation = index.db + "/meta/registry_generation"
+        interval = app.config["QUERY_CACHE_GENERATION_INTERVAL"]
+        try:
+            RegistryAPI._search_cache.clear()
+            RegistryAPI._generation = None
+            app.config["QUERY_CACHE_GENERATION_INTERVAL"] = 60
+            Handler.routes[search] = json.dumps({"hits" : {"total" : 1, "hits" : []}})
+            Handler.routes[generation] = json.dumps({"found" : True, "_version" : 3, "_source" : {"changed" : time.time() - 10}})
+
+            # the generation is read once for the interval, and cached results are served without going to the index
+            RegistryAPI.search(q="repository")
+            RegistryAPI.search(q="repository")
+            RegistryAPI.search(q="open access")
+            assert [r[1] for r in Handler.received if r[1].startswith(generation)] == [generation]
+            assert len([r for r in Handler.received if r[1].startswith(search)]) == 2
+
+            # if the generation can't be read, searches go to the index without the cache
+            RegistryAPI._generation = None
+            Handler.received = []
+            Handler.statuses = [500]
+            RegistryAPI.search(q="repository")
+            assert len([r for r in Handler.received if r[1].startswith(search)]) == 1
+            assert RegistryAPI._generation is None
+        finally:
+            app.config["QUERY_CACHE_GENERATION_INTERVAL"] = interval
+            RegistryAPI._search_cache.clear()
+            RegistryAPI._generation = None
+            index.stop()
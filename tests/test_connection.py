@@ -0,0 +1,144 @@
+from unittest import TestCase
+from portality import connection, dao
+from portality.core import app, initialise_index
+from tests.esstub import Handler, StubIndex
+from portality import app as served
+import requests, json
+
+class TestConnection(TestCase):
+
+    def setUp(self):
+        self.index = StubIndex()
+        self.url = self.index.url
+        self.db = self.index.db
+
+    def tearDown(self):
+        self.index.stop()
+
+    def test_01_session_reused(self):
+        cm = connection.ConnectionManager(backoff=0)
+        s = cm.session()
+        assert cm.get(self.url).status_code == 200
+        assert cm.get(self.url).status_code == 200
+        assert cm.session() is s
+        cm.close()
+        assert cm.session() is not s
+
+    def test_02_retry_status(self):
+        cm = connection.ConnectionManager(retries=2, backoff=0)
+        Handler.statuses = [503, 502]
+        assert cm.get(self.url).status_code == 200
+
+        # once the retries are used up, the last response is returned
+        Handler.statuses = [503, 503, 503, 503]
+        assert cm.get(self.url).status_code == 503
+
+        # other errors are not retried
+        Handler.statuses = [500]
+        assert cm.get(self.url).status_code == 500
+        cm.close()
+
+    def test_03_retry_connect(self):
+        port = self.index.port
+        self.index.stop()
+
+        cm = connection.ConnectionManager(retries=1, backoff=0)
+        with self.assertRaises(requests.ConnectionError):
+            cm.get("http://127.0.0.1:" + str(port) + "/")
+
+    def test_04_dao_requests(self):
+        Handler.body = json.dumps({"hits" : {"hits" : [{"_source" : {"id" : "1"}}]}})
+        res = dao.StatisticsDAO.query(q={"query" : {"match_all" : {}}})
+        assert res["hits"]["hits"][0]["_source"]["id"] == "1"
+
+        Handler.body = json.dumps({"found" : True, "_source" : {"id" : "1", "value" : 10}})
+        stat = dao.StatisticsDAO.pull("1")
+        assert stat.data["value"] == 10
+
+        stat.save()
+
+        assert Handler.received == [
+            ("POST", self.db + "/statistics/_search"),
+            ("GET", self.db + "/statistics/1"),
+            ("PUT", self.db + "/statistics/1")
+        ]
+
+    def test_05_initialise_index(self):
+        db = self.db
+
+        # the index has some of the mappings, so only the missing ones are created
+        Handler.body = json.dumps({app.config["ELASTIC_SEARCH_DB"] : {"mappings" : {"account" : {}, "register" : {}, "meta" : {}}}})
+        assert initialise_index(app) == ["history", "statistics"]
+        assert Handler.received[0] == ("GET", db + "/_mapping")
+        assert sorted(Handler.received[1:]) == [("PUT", db + "/_mapping/history"), ("PUT", db + "/_mapping/statistics")]
+
+        # once they all exist, a single request is made
+        Handler.received = []
+        Handler.body = json.dumps({app.config["ELASTIC_SEARCH_DB"] : {"mappings" : dict([(k, {}) for k in app.config["MAPPINGS"].keys()])}})
+        assert initialise_index(app) == []
+        assert Handler.received == [("GET", db + "/_mapping")]
+
+        # and if there is no index, it is created with all of the mappings at once
+        Handler.received = []
+        Handler.statuses = [404]
+        assert initialise_index(app) == sorted(app.config["MAPPINGS"].keys())
+        assert Handler.received == [("GET", db + "/_mapping"), ("PUT", db)]
+
+    def test_06_bulk_create(self):
+        Handler.body = json.dumps({"items" : [
+            {"create" : {"_id" : "r1_2", "status" : 201}},
+            {"create" : {"_id" : "r2_5", "status" : 409, "error" : "DocumentAlreadyExistsException[[history][r2_5]: document already exists]"}}
+        ]})
+        results = dao.bulk("history", [{"id" : "r1_2"}, {"id" : "r2_5"}], op_type="create")
+
+        # documents are only created, never overwritten, and those whose ids were taken are reported as conflicts
+        lines = Handler.bodies[0].strip().split("\n")
+        assert json.loads(lines[0]) == {"create" : {"_id" : "r1_2"}}
+        assert json.loads(lines[2]) == {"create" : {"_id" : "r2_5"}}
+        assert results[0] == {"id" : "r1_2"}
+        assert results[1]["status"] == 409
+        assert "error" in results[1]
+
+    def test_07_create_not_retried(self):
+        # the index may have carried out a create which it reported as failed, so creates are not retried
+        cm = connection.ConnectionManager(retries=2, backoff=0)
+        Handler.statuses = [503]
+        assert cm.put(self.url, data="{}", retry=False).status_code == 503
+        assert len(Handler.received) == 1
+        cm.close()
+
+        Handler.received = []
+        Handler.statuses = [504]
+        with self.assertRaises(dao.BulkException):
+            dao.bulk("history", [{"id" : "r1_2"}], op_type="create")
+        assert len(Handler.received) == 1
+
+        # but other writes are
+        Handler.received = []
+        Handler.statuses = [504]
+        Handler.body = json.dumps({"items" : [{"index" : {"_id" : "r1", "status" : 200}}]})
+        assert dao.bulk("register", [{"id" : "r1"}]) == [{"id" : "r1"}]
+        assert len(Handler.received) == 2
+
+    def test_08_initialise_on_request(self):
+        init = app.config.get("INITIALISE_INDEX")
+        try:
+            app.config["INITIALISE_INDEX"] = True
+            served._index_ready = False
+            client = served.app.test_client()
+
+            # the index can't be initialised yet, but the request is still served
+            Handler.statuses = [500]
+            assert client.get("/metrics").status_code == 200
+            assert Handler.received == [("GET", self.db + "/_mapping")]
+            assert not served._index_ready
+
+            # so it is tried again on the next request, and once it succeeds, not again after that
+            Handler.body = json.dumps({app.config["ELASTIC_SEARCH_DB"] : {"mappings" : dict([(k, {}) for k in app.config["MAPPINGS"].keys()])}})
+            client.get("/metrics")
+            client.get("/metrics")
+            assert Handler.received == [("GET", self.db + "/_mapping"), ("GET", self.db + "/_mapping")]
+            assert served._index_ready
+        finally:
+            app.config["INITIALISE_INDEX"] = init
+            served._index_ready = False
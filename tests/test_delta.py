@@ -0,0 +1,88 @@
+from unittest import TestCase
+from portality import delta
+from copy import deepcopy
+
+_old = {
+    "register" : {
+        "operational_status" : "Operational",
+        "metadata" : [
+            {
+                "lang" : "en",
+                "default" : True,
+                "record" : {
+                    "name" : "My Repo",
+                    "url" : "http://myrepo",
+                    "repository_type" : ["Institutional"]
+                }
+            }
+        ],
+        "api" : [
+            {
+                "api_type" : "oai-pmh",
+                "version" : "2.0"
+            }
+        ]
+    },
+    "admin" : {
+        "test1" : {
+            "in_opendoar" : True
+        }
+    }
+}
+
+class TestDelta(TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_01_no_changes(self):
+        assert delta.diff(_old, deepcopy(_old)) == []
+        assert delta.apply(_old, []) == _old
+
+    def test_02_round_trip(self):
+        new = deepcopy(_old)
+        new["register"]["metadata"][0]["record"]["name"] = "My Renamed Repo"
+        new["register"]["metadata"][0]["record"]["repository_type"].append("Disciplinary")
+        new["register"]["software"] = [{"name" : "DSpace"}]
+        del new["register"]["api"]
+        new["admin"]["test1"]["in_opendoar"] = 1
+
+        ops = delta.diff(_old, new)
+        assert delta.apply(_old, ops) == new
+
+        # only the things which have changed are in the diff
+        paths = [op["path"] for op in ops]
+        assert "/register/metadata/0/record/name" in paths
+        assert "/register/metadata/0/record/url" not in paths
+        assert "/register/operational_status" not in paths
+
+        # and the original is not modified
+        assert _old["register"]["metadata"][0]["record"]["name"] == "My Repo"
+
+    def test_03_bools_are_not_numbers(self):
+        ops = delta.diff({"default" : True}, {"default" : 1})
+        assert ops == [{"op" : "replace", "path" : "/default", "value" : 1}]
+
+    def test_04_escaped_keys(self):
+        old = {"a/b" : {"c~d" : 1}}
+        new = {"a/b" : {"c~d" : 2}}
+        ops = delta.diff(old, new)
+        assert ops[0]["path"] == "/a~1b/c~0d"
+        assert delta.apply(old, ops) == new
+
+    def test_05_lists(self):
+        ops = [
+            {"op" : "add", "path" : "/l/1", "value" : "x"},
+            {"op" : "add", "path" : "/l/-", "value" : "z"},
+            {"op" : "remove", "path" : "/l/0"}
+        ]
+        assert delta.apply({"l" : ["a", "b"]}, ops) == {"l" : ["x", "b", "z"]}
+
+    def test_06_bad_path(self):
+        with self.assertRaises(delta.DeltaException):
+            delta.apply({"a" : {}}, [{"op" : "replace", "path" : "/b/c", "value" : 1}])
+        with self.assertRaises(delta.DeltaException):
+            delta.apply({"a" : {}}, [{"op" : "replace", "path" : "a", "value" : 1}])
@@ -215,7 +215,90 @@ class TestIntegration(TestCase):
         
         assert j.get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "My Repo 2"
         assert j.get("admin", {}).get("test5", {}).get("some_key") == "some_value"
-    
+
+    def test_02_02_conditional_retrieve(self):
+        reg = {
+            "register" : {
+                "metadata" : [
+                    {
+                        "lang" : "en",
+                        "default" : True,
+                        "record" : {
+                            "name" : "My Repo",
+                            "url" : "http://myrepo",
+                            "repository_type" : ["Institutional"]
+                        }
+                    }
+                ]
+            }
+        }
+        resp = requests.post(BASE_URL + "record?api_key=" + AUTH_TOKEN_1, json.dumps(reg))
+        loc = resp.headers["location"]
+
+        # the first retrieve gives us the etag
+        ret = requests.get(loc)
+        etag = ret.headers.get("etag")
+        assert ret.status_code == 200
+        assert etag is not None
+
+        # asking again with the etag should tell us nothing has changed
+        ret2 = requests.get(loc, headers={"If-None-Match" : etag})
+        assert ret2.status_code == 304
+        assert ret2.headers.get("etag") == etag
+
+        # now update the record, and the etag should no longer match
+        reg["register"]["metadata"][0]["record"]["name"] = "My Updated Repo"
+        requests.post(loc + "?api_key=" + AUTH_TOKEN_1, json.dumps(reg))
+
+        ret3 = requests.get(loc, headers={"If-None-Match" : etag})
+        assert ret3.status_code == 200
+        assert ret3.headers.get("etag") != etag
+        assert ret3.json().get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "My Updated Repo"
+
+    def test_02_03_batch_retrieve(self):
+        ids = []
+        for name in ["Batch Repo 1", "Batch Repo 2"]:
+            reg = {
+                "register" : {
+                    "metadata" : [
+                        {
+                            "lang" : "en",
+                            "default" : True,
+                            "record" : {
+                                "name" : name,
+                                "url" : "http://myrepo",
+                                "repository_type" : ["Institutional"]
+                            }
+                        }
+                    ]
+                }
+            }
+            resp = requests.post(BASE_URL + "record?api_key=" + AUTH_TOKEN_1, json.dumps(reg))
+            ids.append(resp.json().get("id"))
+
+        # retrieve both records and one which does not exist
+        resp = requests.get(BASE_URL + "records?ids=" + ids[0] + ",doesnotexist," + ids[1])
+        assert resp.status_code == 200
+        j = resp.json()
+
+        assert len(j) == 3
+        assert j[0].get("id") == ids[0]
+        assert j[0].get("found") is True
+        assert j[0].get("record", {}).get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "Batch Repo 1"
+        assert j[1].get("id") == "doesnotexist"
+        assert j[1].get("found") is False
+        assert "record" not in j[1]
+        assert j[2].get("record", {}).get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "Batch Repo 2"
+
+        # the same via a POST
+        resp = requests.post(BASE_URL + "records", json.dumps(ids))
+        assert resp.status_code == 200
+        assert [r.get("id") for r in resp.json()] == ids
+
+        # and a malformed request
+        resp = requests.post(BASE_URL + "records", "not json")
+        assert resp.status_code == 400
+
     ##########################################################
     ## Tests for updating/patching a register object
     ##########################################################
@@ -962,7 +1045,57 @@ class TestIntegration(TestCase):
         # issue the delete request
         resp2 = requests.delete(loc + "?api_key=" + AUTH_TOKEN_2)
         assert resp2.status_code == 401
-    
+
+    def test_05_03_bulk(self):
+        reg = {
+            "register" : {
+                "metadata" : [
+                    {
+                        "lang" : "en",
+                        "default" : True,
+                        "record" : {
+                            "name" : "My Repo 3",
+                            "url" : "http://myrepo",
+                            "repository_type" : ["Institutional"]
+                        }
+                    }
+                ]
+            }
+        }
+        resp = requests.post(BASE_URL + "record?api_key=" + AUTH_TOKEN_1, json.dumps(reg))
+        record_id = resp.json().get("id")
+
+        renamed = {"metadata" : [{"lang" : "en", "default" : True, "record" : {"name" : "My Renamed Repo", "url" : "http://myrepo"}}]}
+        ops = [
+            {"op" : "create", "record" : reg},
+            {"op" : "merge", "id" : record_id, "record" : renamed},
+            {"op" : "replace", "id" : record_id, "record" : {}},
+            {"op" : "delete", "id" : "not a record"},
+            {"op" : "delete", "id" : [record_id]},
+            {"op" : "merge", "id" : record_id, "record" : {"register" : "not an object"}}
+        ]
+        resp = requests.post(BASE_URL + "records/bulk?api_key=" + AUTH_TOKEN_1, json.dumps(ops))
+        assert resp.status_code == 200
+        j = resp.json()
+        assert j["succeeded"] == 2
+        assert j["failed"] == 4
+        assert [r["status"] for r in j["results"]] == [201, 200, 400, 404, 400, 400]
+
+        # the created record exists, and the merge has been applied and recorded in the history
+        resp = requests.get(BASE_URL + "record/" + j["results"][0]["id"])
+        assert resp.status_code == 200
+
+        resp = requests.get(BASE_URL + "record/" + record_id)
+        assert resp.json()["register"]["metadata"][0]["record"]["name"] == "My Renamed Repo"
+
+        time.sleep(2)
+        resp = requests.get(BASE_URL + "record/" + record_id + "/history")
+        assert len(resp.json()) == 1
+
+        # and an account without registry access can do none of it
+        resp = requests.post(BASE_URL + "records/bulk?api_key=" + AUTH_TOKEN_2, json.dumps(ops))
+        assert resp.status_code == 401
+
     ##########################################################
     ## Tests on retrieving histories
     ##########################################################
@@ -1231,6 +1364,74 @@ class TestIntegration(TestCase):
         
         assert newest.get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "My Repo 3"
         assert newest.get("register", {}).get("software", [{}])[0].get("name") == "DSpace"
+    
+    def test_06_06_previous_versions(self):
+        # create the base version, and then update it twice
+        reg = {
+            "register" : {
+                "metadata" : [
+                    {
+                        "lang" : "en",
+                        "default" : True,
+                        "record" : {
+                            "name" : "Version 1",
+                            "url" : "http://myrepo",
+                            "repository_type" : ["Institutional"]
+                        }
+                    }
+                ]
+            }
+        }
+        resp = requests.post(BASE_URL + "record?api_key=" + AUTH_TOKEN_1, json.dumps(reg))
+        loc = resp.headers["Location"]
+        
+        time.sleep(2)
+        reg["register"]["metadata"][0]["record"]["name"] = "Version 2"
+        requests.post(loc + "?api_key=" + AUTH_TOKEN_1, json.dumps(reg))
+        
+        time.sleep(2)
+        between = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+        time.sleep(2)
+        
+        reg["register"]["metadata"][0]["record"]["name"] = "Version 3"
+        requests.post(loc + "?api_key=" + AUTH_TOKEN_1, json.dumps(reg))
+        
+        # let the index catch up
+        time.sleep(2)
+        
+        # each history entry is numbered, and can be retrieved by that number
+        resp2 = requests.get(loc + "?version=1")
+        assert resp2.status_code == 200
+        assert resp2.json().get("ver") == 1
+        assert resp2.json().get("id") == loc.split("/")[-1]
+        assert "about" not in resp2.json()
+        assert "triggered_by_account" not in resp2.json()
+        assert resp2.json().get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "Version 1"
+        
+        resp3 = requests.get(loc + "?version=2")
+        assert resp3.json().get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "Version 2"
+        
+        resp4 = requests.get(loc + "?version=3")
+        assert resp4.status_code == 404
+        
+        # and we can get the record as it was at a point in time
+        resp5 = requests.get(loc + "?as_of=" + between)
+        assert resp5.status_code == 200
+        assert resp5.json().get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "Version 2"
+        assert resp5.json().get("id") == loc.split("/")[-1]
+        assert resp5.json().get("ver") == 2
+        assert "about" not in resp5.json()
+        
+        # including when it is the current record
+        resp5 = requests.get(loc + "?as_of=" + datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"))
+        assert resp5.json().get("id") == loc.split("/")[-1]
+        assert resp5.json().get("register", {}).get("metadata", [{}])[0].get("record", {}).get("name") == "Version 3"
+        
+        resp6 = requests.get(loc + "?as_of=2000-01-01")
+        assert resp6.status_code == 404
+        
+        resp7 = requests.get(loc + "?as_of=notadate")
+        assert resp7.status_code == 400
         
     ##################################################
     ## Test for creating and retrieving stats
@@ -1381,7 +1582,51 @@ class TestIntegration(TestCase):
         assert resp3.status_code == 200
         j = resp3.json()
         assert j.get("success") == "true"
-    
+
+    def test_07_04_bulk_stats(self):
+        # create the base version
+        reg = {
+            "register" : {
+                "metadata" : [
+                    {
+                        "lang" : "en",
+                        "default" : True,
+                        "record" : {
+                            "name" : "My Repo 3",
+                            "url" : "http://myrepo",
+                            "repository_type" : ["Institutional"]
+                        }
+                    }
+                ]
+            }
+        }
+        resp = requests.post(BASE_URL + "record?api_key=" + AUTH_TOKEN_4, json.dumps(reg))
+        record_id = resp.json().get("id")
+
+        # send a mixture of good and bad statistics in one request
+        stats = [
+            { "about" : record_id, "value" : "10", "type" : "record_count", "date" : "2014-01-01T12:00:00Z"},
+            { "about" : record_id, "value" : "not a number", "type" : "record_count"},
+            { "about" : "not a record", "value" : "20", "type" : "record_count"},
+            { "about" : record_id, "value" : "30", "type" : "record_count", "date" : "2014-03-01"},
+            { "about" : {}, "value" : "40", "type" : "record_count"},
+            { "about" : [record_id], "value" : "50", "type" : "record_count"}
+        ]
+        resp = requests.post(BASE_URL + "stats/bulk?api_key=" + AUTH_TOKEN_4, json.dumps(stats))
+        assert resp.status_code == 200
+        j = resp.json()
+        assert j["created"] == 2
+        assert j["failed"] == 4
+        assert [r["status"] for r in j["results"]] == [201, 400, 404, 201, 400, 400]
+
+        # give the index time to catch up
+        time.sleep(2)
+
+        resp = requests.get(BASE_URL + "record/" + record_id + "/stats")
+        ids = [s["id"] for s in resp.json()]
+        assert j["results"][0]["id"] in ids
+        assert j["results"][3]["id"] in ids
+
     ##################################################
     ## Test for creating and retrieving admin data
     ##################################################
@@ -1476,6 +1721,64 @@ class TestIntegration(TestCase):
         assert "test5" in j["admin"]
         assert j["admin"]["test5"]["justthis"] == "key"
         assert "akey" not in j["admin"]["test5"]
+    
+    #########################################################
+    ## Test for dumping the registry
+    #########################################################
+    
+    def test_09_01_dump(self):
+        # create a record with a statistic, so that there is something of each type to dump
+        reg = {
+            "register" : {
+                "metadata" : [
+                    {
+                        "lang" : "en",
+                        "default" : True,
+                        "record" : {
+                            "name" : "My Dumped Repo",
+                            "url" : "http://myrepo",
+                            "repository_type" : ["Institutional"]
+                        }
+                    }
+                ]
+            }
+        }
+        resp = requests.post(BASE_URL + "record?api_key=" + AUTH_TOKEN_4, json.dumps(reg))
+        record_id = resp.json().get("id")
+        stats = [{ "about" : record_id, "value" : "10", "type" : "record_count"}]
+        resp = requests.post(BASE_URL + "stats/bulk?api_key=" + AUTH_TOKEN_4, json.dumps(stats))
+        
+        # give the index time to catch up
+        time.sleep(2)
+        
+        # every record is dumped, one json object per line
+        resp = requests.get(BASE_URL + "dump")
+        assert resp.status_code == 200
+        assert resp.headers["Content-Type"].startswith("application/x-ndjson")
+        assert resp.text.endswith("\n")
+        lines = resp.text.split("\n")[:-1]
+        total = models.Register.query(q={"query" : {"match_all" : {}}, "size" : 0})["hits"]["total"]
+        assert len(lines) == total
+        docs = [json.loads(l) for l in lines]
+        assert all(["id" in d and "register" in d for d in docs])
+        dumped = [d for d in docs if d["id"] == record_id]
+        assert len(dumped) == 1
+        assert dumped[0]["register"]["metadata"][0]["record"]["name"] == "My Dumped Repo"
+        
+        # as are the statistics
+        resp = requests.get(BASE_URL + "dump?type=statistics")
+        assert resp.status_code == 200
+        docs = [json.loads(l) for l in resp.text.split("\n")[:-1]]
+        assert len([d for d in docs if d.get("about") == record_id]) == 1
+    
+    def test_09_02_dump_fail(self):
+        # accounts are not part of the registry
+        resp = requests.get(BASE_URL + "dump?type=account")
+        assert resp.status_code == 400
+        
+        # and nor is anything which is not a type at all
+        resp = requests.get(BASE_URL + "dump?type=notatype")
+        assert resp.status_code == 400
         
     
     
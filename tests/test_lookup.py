@@ -0,0 +1,44 @@
+from unittest import TestCase
+from portality import lookup
+
+class TestLookup(TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_01_country(self):
+        assert lookup.country("GB") == ("United Kingdom", "eu", "Europe")
+        assert lookup.country("gb") == lookup.country("GB")
+        assert lookup.country("zz") is None
+        assert lookup.country(None) is None
+
+    def test_02_language(self):
+        assert lookup.language("en") == "English"
+        assert lookup.language("EN") == "English"
+        assert lookup.language("zz") is None
+
+    def test_03_enrich(self):
+        register = {
+            "metadata" : [
+                {"lang" : "en", "record" : {"country_code" : "gr", "language_code" : ["el", "en"]}},
+                {"lang" : "fr", "record" : {"country_code" : "gb", "country" : "Royaume-Uni", "language_code" : ["zz"]}}
+            ],
+            "organisation" : [{"details" : {"country_code" : "GR"}}, {"role" : ["host"]}]
+        }
+        lookup.enrich(register)
+
+        record = register["metadata"][0]["record"]
+        assert record["country"] == "Greece"
+        assert record["continent_code"] == "eu"
+        assert record["continent"] == "Europe"
+        assert record["language"] == ["Greek, Modern (1453-)", "English"]
+
+        # supplied names are not overwritten, and unknown codes are not guessed at
+        record = register["metadata"][1]["record"]
+        assert record["country"] == "Royaume-Uni"
+        assert "language" not in record
+
+        assert register["organisation"][0]["details"]["country"] == "Greece"
@@ -0,0 +1,74 @@
+from unittest import TestCase
+from portality import metrics
+from portality.core import app
+import tempfile, shutil, json, os
+
+class _Thing(object):
+    __type__ = "thing"
+
+    @metrics.timed_es("pull")
+    def pull(self, fail=False):
+        if fail:
+            raise ValueError()
+        return "pulled"
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        self.counter = metrics.Counter("test_counter_total", "A counter", ["kind"])
+        self.histogram = metrics.Histogram("test_duration_seconds", "A histogram", ["route"], buckets=[0.1, 1.0])
+
+    def tearDown(self):
+        metrics._metrics.remove(self.counter)
+        metrics._metrics.remove(self.histogram)
+        app.config["METRICS_DIR"] = None
+
+    def test_01_render(self):
+        self.counter.inc(kind="a")
+        self.counter.inc(2, kind="a")
+        self.counter.inc(kind='b"')
+        self.histogram.observe(0.05, route="/record")
+        self.histogram.observe(0.1, route="/record")
+        self.histogram.observe(5, route="/record")
+
+        text = metrics.render()
+        assert "# TYPE test_counter_total counter" in text
+        assert 'test_counter_total{kind="a"} 3' in text
+        assert 'test_counter_total{kind="b\\""} 1' in text
+
+        # buckets are cumulative, and include their upper bound
+        assert 'test_duration_seconds_bucket{route="/record",le="0.1"} 2' in text
+        assert 'test_duration_seconds_bucket{route="/record",le="1.0"} 2' in text
+        assert 'test_duration_seconds_bucket{route="/record",le="+Inf"} 3' in text
+        assert 'test_duration_seconds_count{route="/record"} 3' in text
+        assert 'test_duration_seconds_sum{route="/record"} 5.15' in text
+
+    def test_02_timed_es(self):
+        assert _Thing().pull() == "pulled"
+        with self.assertRaises(ValueError):
+            _Thing().pull(fail=True)
+
+        # failed calls are timed too
+        counts = metrics.collect()["oarr_es_call_duration_seconds"][(u"thing", u"pull")]
+        assert sum(counts[:-1]) == 2
+
+    def test_03_processes(self):
+        d = tempfile.mkdtemp()
+        try:
+            app.config["METRICS_DIR"] = d
+
+            # another process has recorded some metrics
+            with open(os.path.join(d, "1-1.json"), "w") as f:
+                json.dump({"test_counter_total" : [[["a"], 5]], "test_duration_seconds" : [[["/record"], [1, 0, 0, 0.05]]]}, f)
+
+            self.counter.inc(kind="a")
+            self.histogram.observe(0.5, route="/record")
+
+            merged = metrics.collect()
+            assert merged["test_counter_total"][(u"a",)] == 6
+            assert merged["test_duration_seconds"][(u"/record",)] == [1, 1, 0, 0.55]
+
+            # and this process's metrics have been written out for the others to see
+            assert len(os.listdir(d)) == 2
+        finally:
+            shutil.rmtree(d)
@@ -0,0 +1,175 @@
+from unittest import TestCase
+import os, sys, tempfile, shutil
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "portality", "migrate"))
+import fromapi
+
+SOURCE = """<?xml version="1.0" encoding="UTF-8"?>
+<OpenDOAR>
+<repositories>
+<repository rID="1">
+    <rName>First</rName>
+</repository>
+<repository rID="12">
+    <rName>Second</rName>
+</repository>
+<repository rID="123">
+    <rName>Third</rName>
+</repository>
+</repositories>
+</OpenDOAR>
+"""
+
+class TestMigrate(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "opendoar.xml")
+        with open(self.source, "w") as f:
+            f.write(SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_01_fingerprint(self):
+        record = {
+            "register" : {"metadata" : [{"lang" : "en", "record" : {"name" : "My Repo"}}]},
+            "admin" : {"opendoar" : {"rid" : "1", "in_opendoar" : True, "last_saved" : "2014-01-01T00:00:00Z"}}
+        }
+        fp = fromapi.fingerprint(record)
+
+        # the date of the migration and any fingerprint already recorded make no difference
+        record["admin"]["opendoar"]["last_saved"] = "2015-01-01T00:00:00Z"
+        record["admin"]["opendoar"]["fingerprint"] = fp
+        assert fromapi.fingerprint(record) == fp
+
+        # but a change to the register or to the rest of the opendoar admin data does
+        record["register"]["metadata"][0]["record"]["name"] = "My Renamed Repo"
+        renamed = fromapi.fingerprint(record)
+        assert renamed != fp
+        record["admin"]["opendoar"]["in_opendoar"] = False
+        assert fromapi.fingerprint(record) != renamed
+
+    def test_02_stat_id(self):
+        stat = {"about" : "abcd", "third_party" : "opendoar", "type" : "item_count", "date" : "2014-01-01", "value" : 10}
+        sid = fromapi.stat_id(stat)
+
+        # the same statistic has the same id, whatever its value
+        assert fromapi.stat_id(dict(stat, value=20)) == sid
+
+        # but it differs for a different record, source, type or date
+        for field in ["about", "third_party", "type", "date"]:
+            assert fromapi.stat_id(dict(stat, **{field : u"other \u00e9"})) != sid
+
+    def test_03_resume_point(self):
+        size = len(SOURCE)
+
+        # the point is just after the end of the repository, which must have been read by the offset
+        point = fromapi.resume_point(self.source, "12", size)
+        assert SOURCE[:point].endswith('<rName>Second</rName>\n</repository>')
+
+        # the rID must match exactly, not just as a prefix
+        point = fromapi.resume_point(self.source, "1", size)
+        assert SOURCE[:point].endswith('<rName>First</rName>\n</repository>')
+
+        # repositories which are missing, or were not read by the offset, can't be resumed from
+        assert fromapi.resume_point(self.source, "999", size) is None
+        assert fromapi.resume_point(self.source, "123", SOURCE.index('rID="123"')) is None
+        assert fromapi.resume_point(self.source, None, size) is None
+
+        # and resuming parses only the repositories after the point
+        point = fromapi.resume_point(self.source, "1", size)
+        rids = [repo.get("rID") for repo, offset in fromapi.iter_repos(self.source, start=point)]
+        assert rids == ["12", "123"]
+
+    def test_04_prolog(self):
+        with open(self.source, "rb") as f:
+            prolog = fromapi._prolog(f)
+        assert prolog == SOURCE[:SOURCE.index("<repository ")]
+
+        empty = os.path.join(self.dir, "empty.xml")
+        with open(empty, "w") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<OpenDOAR><repositories/></OpenDOAR>\n')
+        with open(empty, "rb") as f:
+            with self.assertRaises(ValueError):
+                fromapi._prolog(f)
+
+    def test_05_checkpoint(self):
+        path = os.path.join(self.dir, "checkpoint")
+        cp = fromapi.Checkpoint(path, self.source)
+        assert cp.load() is None
+
+        cp.save("12", 1024)
+        assert cp.load() == ("12", 1024)
+        assert not os.path.exists(path + ".tmp")
+
+        # a checkpoint for one source does not apply to another
+        other = fromapi.Checkpoint(path, os.path.join(self.dir, "other.xml"))
+        assert other.load() is None
+
+        # nor does one which can't be read
+        with open(path, "w") as f:
+            f.write("not json")
+        assert cp.load() is None
+
+        cp.save("123", 2048)
+        cp.clear()
+        assert not os.path.exists(path)
+        assert cp.load() is None
+        cp.clear()
+
+    def test_06_apply(self):
+        obj = {
+            "register" : {
+                "metadata" : [
+                    {"lang" : "en", "record" : {"name" : "one"}},
+                    {"lang" : "fr", "record" : {"name" : "un"}},
+                    {"lang" : "de"}
+                ],
+                "contact" : []
+            }
+        }
+        fromapi._apply(obj, ["register", "metadata", "record", "country"], "gb")
+
+        # the value is set in every entry of the list which has the rest of the path
+        metadata = obj["register"]["metadata"]
+        assert metadata[0]["record"] == {"name" : "one", "country" : "gb"}
+        assert metadata[1]["record"] == {"name" : "un", "country" : "gb"}
+        assert metadata[2] == {"lang" : "de"}
+
+        # the last field is set in every entry of a list, and entries don't share the value
+        fromapi._apply(obj, ["register", "metadata", "default"], {"set" : True})
+        assert [m["default"] for m in metadata] == [{"set" : True}] * 3
+        metadata[0]["default"]["set"] = False
+        assert metadata[1]["default"] == {"set" : True}
+
+        # paths which lead nowhere are left alone
+        fromapi._apply(obj, ["register", "contact", "details", "name"], "x")
+        fromapi._apply(obj, ["register", "missing", "name"], "x")
+        fromapi._apply(obj, ["register", "metadata", "lang", "name"], "x")
+        assert obj["register"]["contact"] == []
+        assert "missing" not in obj["register"]
+        assert metadata[0]["lang"] == "en"
+
+    def test_07_loader_without_rid(self):
+        def repo(name, rid=None):
+            record = {"register" : {"metadata" : [{"lang" : "en", "default" : True, "record" : {"name" : name, "url" : "http://repo"}}]}}
+            if rid is not None:
+                record["admin"] = {"opendoar" : {"rid" : rid}}
+            return record
+
+        loader = fromapi.Loader(batch_size=100)
+        loader.add(repo("First", "1"), [], 10)
+        loader.add(repo("No rID"), [], 20)
+        loader.add(repo("Also no rID"), [], 30)
+
+        # repositories without an rID are each created as a new record, and can't be resumed after
+        assert len(loader.creates) == 3
+        assert len(set([r.id for r in loader.creates])) == 3
+        assert loader.id_map.keys() == ["1"]
+        assert loader.position == ("1", 10)
+        assert loader.creates[1].data["admin"]["opendoar"]["fingerprint"] == fromapi.fingerprint(repo("No rID"))
+
+        # so even an identical one is not taken to be unchanged
+        loader.add(repo("No rID"), [], 40)
+        assert len(loader.creates) == 4
+        assert loader.unchanged == 0
@@ -0,0 +1,98 @@
+from unittest import TestCase
+from portality import profiling
+from portality.core import app
+from portality.app import app as served
+from tests.esstub import Handler, StubIndex
+import time, tempfile, shutil, os, json, sys, threading
+
+def _slow_python():
+    return sum([i * i for i in range(200000)])
+
+def _waiting():
+    time.sleep(0.1)
+
+@served.route("/profiling/error")
+def _error():
+    raise ValueError("failed")
+
+class TestProfiling(TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        app.config["PROFILE_DIR"] = None
+        app.config["SUPER_USER"] = []
+
+    def test_01_report(self):
+        p = profiling.Profile("GET /query")
+        p.start()
+        _slow_python()
+        profiling.record_es(20)
+        profiling.record_es(30)
+        p.stop()
+
+        # once stopped, nothing more is recorded against the profile
+        profiling.record_es(1000)
+        assert profiling.current() is None
+
+        report = p.report(status=200, top=10)
+        assert report["route"] == "GET /query"
+        assert report["status"] == 200
+        assert report["es_ms"] == 50
+        assert report["es_requests"] == 2
+        assert report["python_ms"] <= report["total_ms"]
+        assert len(report["functions"]) <= 10
+        assert any(["_slow_python" in f["function"] for f in report["functions"]])
+        assert "samples" not in report
+
+    def test_02_sample(self):
+        p = profiling.Profile("GET /dump", sample=True)
+        p.start()
+        _waiting()
+        p.stop()
+
+        samples = p.report()["samples"]
+        assert samples["count"] > 0
+        waiting = [f for f in samples["functions"] if "_waiting" in f["function"]]
+        assert len(waiting) == 1
+        assert waiting[0]["samples"] > 0
+        assert "_waiting" in samples["stacks"][0]["stack"][-1]
+
+    def test_03_store(self):
+        assert profiling.store({"route" : "GET /"}) is None
+
+        d = tempfile.mkdtemp()
+        try:
+            app.config["PROFILE_DIR"] = d
+            name = profiling.store({"route" : "GET /"})
+            with open(os.path.join(d, name)) as f:
+                assert json.load(f) == {"route" : "GET /"}
+        finally:
+            shutil.rmtree(d)
+
+    def test_04_request_raises(self):
+        # a superuser's account, as the index returns it when looked up by api key
+        index = StubIndex()
+        init = app.config.get("INITIALISE_INDEX")
+        propagate = app.config.get("PROPAGATE_EXCEPTIONS")
+        try:
+            app.config["INITIALISE_INDEX"] = False
+            app.config["PROPAGATE_EXCEPTIONS"] = False
+            app.config["SUPER_USER"] = ["profiler"]
+            account = {"id" : "profiler", "name" : "profiler", "api_key" : "profiler-key"}
+            Handler.body = json.dumps({"hits" : {"total" : 1, "hits" : [{"_id" : "profiler", "_source" : account}]}})
+            threads = threading.active_count()
+
+            client = served.test_client()
+            resp = client.get("/profiling/error?profile=1&sample=1&api_key=profiler-key")
+            assert resp.status_code == 500
+
+            # the profile is stopped even though the request failed
+            assert profiling.current() is None
+            assert sys.getprofile() is None
+            assert threading.active_count() == threads
+        finally:
+            app.config["INITIALISE_INDEX"] = init
+            app.config["PROPAGATE_EXCEPTIONS"] = propagate
+            index.stop()
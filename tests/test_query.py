@@ -0,0 +1,96 @@
+from unittest import TestCase
+from portality import dao
+
+class TestQuery(TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_01_cursor_round_trip(self):
+        token = dao.encode_cursor([1400000000000, "abcd"])
+        assert dao.decode_cursor(token) == [1400000000000, "abcd"]
+
+        with self.assertRaises(ValueError):
+            dao.decode_cursor("not a cursor")
+        with self.assertRaises(ValueError):
+            dao.decode_cursor(dao.encode_cursor({"not" : "a list"}))
+
+    def test_02_first_page(self):
+        sq = dao.SearchQuery(query_string="repository", from_number=20, cursor=dao.FIRST_CURSOR)
+        q = sq.query()
+
+        # cursor pages are sorted stably, ignore from, and have a default size
+        assert "from" not in q
+        assert q["size"] == dao.SearchQuery.default_cursor_size
+        assert q["sort"] == [{"last_updated" : {"order" : "asc"}}, {"id.exact" : {"order" : "asc"}}]
+        assert "query_string" in q["query"]
+
+    def test_03_next_page(self):
+        es = {"query" : {"term" : {"register.metadata.record.country_code.exact" : "gb"}}, "sort" : {"id" : "desc"}}
+        cursor = dao.encode_cursor([1400000000000, "abcd"])
+        sq = dao.SearchQuery(full_query=es, size=50, cursor=cursor)
+        q = sq.query()
+
+        assert q["size"] == 50
+        assert q["sort"][0] == {"last_updated" : {"order" : "asc"}}
+
+        # the original query must still be applied, along with the restriction to records after the cursor
+        must = q["query"]["bool"]["must"]
+        assert must[0] == {"term" : {"register.metadata.record.country_code.exact" : "gb"}}
+        assert must[1]["bool"]["should"][0] == {"range" : {"last_updated" : {"gt" : 1400000000000}}}
+
+        # and the caller's query object is untouched
+        assert es["sort"] == {"id" : "desc"}
+
+    def test_04_next_cursor(self):
+        res = {"hits" : {"hits" : [
+            {"_id" : "1", "sort" : [1, "1"]},
+            {"_id" : "2", "sort" : [2, "2"]}
+        ]}}
+        assert dao.decode_cursor(dao.next_cursor(res, 2)) == [2, "2"]
+
+        # a short page is the last page
+        assert dao.next_cursor(res, 3) is None
+        assert dao.next_cursor({"hits" : {"hits" : []}}, 3) is None
+
+    def test_05_no_cursor(self):
+        sq = dao.SearchQuery(from_number=10, size=5, order=("last_updated", "asc"))
+        q = sq.query()
+        assert q["from"] == 10
+        assert q["sort"] == {"last_updated" : {"order" : "asc"}}
+
+    def test_06_stats_series(self):
+        sq = dao.StatsSeriesQuery("month", "max", "1234", stat_type="item_count")
+        q = sq.query()
+
+        # only the aggregation is requested, over the usual stats filters
+        assert q["size"] == 0
+        assert "sort" not in q
+        assert {"term" : {"about.exact" : "1234"}} in q["query"]["bool"]["must"]
+        assert {"term" : {"type.exact" : "item_count"}} in q["query"]["bool"]["must"]
+        assert q["aggs"]["series"]["date_histogram"]["interval"] == "month"
+        assert q["aggs"]["series"]["aggs"]["value"] == {"max" : {"field" : "value"}}
+
+        res = {"aggregations" : {"series" : {"buckets" : [
+            {"key_as_string" : "2014-01-01T00:00:00Z", "doc_count" : 2, "value" : {"value" : 10.0}}
+        ]}}}
+        assert sq.unpack(res) == [{"date" : "2014-01-01T00:00:00Z", "value" : 10.0, "count" : 2}]
+
+    def test_07_stats_series_last(self):
+        sq = dao.StatsSeriesQuery("day", "last", "1234")
+        q = sq.query()
+        assert "top_hits" in q["aggs"]["series"]["aggs"]["value"]
+
+        res = {"aggregations" : {"series" : {"buckets" : [
+            {"key_as_string" : "2014-01-01T00:00:00Z", "doc_count" : 2, "value" : {"hits" : {"hits" : [{"_source" : {"value" : 7.0}}]}}}
+        ]}}}
+        assert sq.unpack(res) == [{"date" : "2014-01-01T00:00:00Z", "value" : 7.0, "count" : 2}]
+
+    def test_08_stats_series_invalid(self):
+        with self.assertRaises(ValueError):
+            dao.StatsSeriesQuery("fortnight", "max", "1234")
+        with self.assertRaises(ValueError):
+            dao.StatsSeriesQuery("month", "median", "1234")
@@ -216,3 +216,19 @@ class TestSchema(TestCase):
         
         
 
+    
+    def test_06_trusted(self):
+        invalid = deepcopy(_example1)
+        invalid["register"]["not_a_field"] = "value"
+        
+        # untrusted data is validated on construction
+        with self.assertRaises(models.ModelException):
+            models.Register(invalid)
+        
+        # but records from the index are not validated again
+        reg = models.Register.from_index(deepcopy(invalid))
+        assert reg.register.get("not_a_field") == "value"
+        
+        # and changes to them are still validated
+        with self.assertRaises(models.ModelException):
+            reg.merge_register({"register" : {"also_not_a_field" : "value"}})
@@ -392,3 +392,34 @@ class TestSchema(TestCase):
     
     
     
+    
+    def test_11_compiled(self):
+        compiled = schema.compile_schema(_complete)
+        
+        # compiling is idempotent, and nested schemas are compiled too
+        assert schema.compile_schema(compiled) is compiled
+        assert isinstance(compiled.list_entries["list1"].object_entries["listobj"], schema.CompiledSchema)
+        
+        correct = {
+            "mybool1" : True,
+            "field1" : "stuff",
+            "list1" : [{
+                "listbool" : True,
+                "listobj" : {
+                    "objfield1" : "object property 1"
+                }
+            }],
+            "obj1" : {
+                "objobj" : {
+                    "objfield3" : "3"
+                }
+            }
+        }
+        schema.validate(correct, compiled)
+        
+        # the compiled schema can be reused, and still picks up errors deep in the object
+        wrong = deepcopy(correct)
+        wrong["list1"][0]["listobj"]["objfield3"] = "not allowed here"
+        with self.assertRaises(schema.ObjectSchemaValidationError):
+            schema.validate(wrong, compiled)
+        schema.validate(correct, compiled)
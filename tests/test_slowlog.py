@@ -0,0 +1,56 @@
+from unittest import TestCase
+from portality import slowlog
+from portality.core import app
+import tempfile, shutil, os, json
+
+class TestSlowLog(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "slow.{pid}.log")
+        self.file = os.path.join(self.dir, "slow." + str(os.getpid()) + ".log")
+
+    def tearDown(self):
+        app.config["SLOW_QUERY_LOG"] = None
+        app.config["SLOW_QUERY_THRESHOLD"] = 1000
+        shutil.rmtree(self.dir)
+
+    def _entries(self):
+        if not os.path.exists(self.file):
+            return []
+        with open(self.file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_01_record(self):
+        l = slowlog.SlowQueryLog(self.path)
+        q = {"query" : {"term" : {"about.exact" : "1234"}}}
+        l.record("statistics", q, 1500.4, {"took" : 1400, "hits" : {"total" : 12, "hits" : []}})
+        l.wait()
+
+        entries = self._entries()
+        assert len(entries) == 1
+        assert entries[0]["type"] == "statistics"
+        assert entries[0]["hash"] == slowlog.query_hash({"query" : {"term" : {"about.exact" : "1234"}}})
+        assert entries[0]["took_ms"] == 1400
+        assert entries[0]["wall_ms"] == 1500
+        assert entries[0]["hits"] == 12
+        assert entries[0]["route"] is None
+
+    def test_02_threshold(self):
+        app.config["SLOW_QUERY_LOG"] = self.path
+        app.config["SLOW_QUERY_THRESHOLD"] = 100
+
+        q = {"query" : {"match_all" : {}}}
+        slowlog.check("register", q, 20, {"took" : 10, "hits" : {"total" : 1}})
+        slowlog.check("register", q, 20, {"took" : 150, "hits" : {"total" : 2}})
+        slowlog.check("register", q, 250, {"error" : "failed"})
+        slowlog.log().wait()
+
+        entries = self._entries()
+        assert [e["hits"] for e in entries] == [2, None]
+
+    def test_03_off(self):
+        app.config["SLOW_QUERY_THRESHOLD"] = 0
+        assert slowlog.log() is None
+        slowlog.check("register", {}, 5000, {"took" : 5000})
+        assert not os.path.exists(self.file)